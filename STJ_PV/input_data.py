@@ -36,6 +36,12 @@ class InputData:
     # this should be overridden in child classes for each metric
     load_vars = []
 
+    # Dimensions which are not split between chunks
+    chunk_excl = ('lev', 'lat')
+
+    # Number of points beyond the latitude band (if set) which are also loaded
+    lat_halo = 0
+
     def __init__(self, props, date_s=None, date_e=None):
         """Initialize InputData object, using JetFindRun class."""
         self.props = props
@@ -49,6 +55,9 @@ class InputData:
         self.in_data = {}
         self.out_data = {}
 
+        # Floating point precision for input data, if None, use precision of the files
+        self.precision = props.config.get('precision', None)
+
         self.sel = {self.data_cfg['time']: slice(None),
                     self.data_cfg['lev']: slice(None),
                     self.data_cfg['lat']: slice(None),
@@ -62,6 +71,10 @@ class InputData:
         if date_s is not None or date_e is not None:
             self.sel[self.data_cfg['time']] = slice(date_s, date_e)
 
+        # Absolute latitude (start, end) selected in both hemispheres, if None, all
+        # latitudes are loaded
+        self.lat_band = None
+
         self._select_setup()
 
     def _select_setup(self):
@@ -75,6 +88,29 @@ class InputData:
             if _start and _end in cfg:
                 self.sel[cfg[cvar]] = slice(cfg[_start], cfg[_end])
 
+    def _lat_index(self, lat, halo=0):
+        """
+        Get indices of latitude within the latitude band of either hemisphere.
+
+        Parameters
+        ----------
+        lat : array_like
+            1-D latitude, in the order it is stored
+        halo : int
+            Number of points to extend the band by, on each side in each hemisphere
+
+        Returns
+        -------
+        lat_idx : array_like
+            1-D array of increasing indices of `lat` within the band(s)
+
+        """
+        in_band = (np.abs(lat) >= self.lat_band[0]) & (np.abs(lat) <= self.lat_band[1])
+        if halo:
+            # Any point within `halo` points of the band is also selected
+            in_band = np.convolve(in_band, np.ones(2 * halo + 1), mode='same') > 0
+        return np.where(in_band)[0]
+
     def _load_data(self):
         """Load all required data."""
         for data_var in self.load_vars:
@@ -85,10 +121,14 @@ class InputData:
 
     def _chunk_data(self, var):
         """Re-chunk input data to ideal size."""
-        self.in_data[var] = self.in_data[var].chunk(self.chunk)
+        data = self.in_data[var]
+        self.in_data[var] = data.chunk({dim: size for dim, size in self.chunk.items()
+                                        if dim in data.dims})
 
-    def _set_chunks(self, data, max_size=3e6, excldims=('lev', 'lat')):
+    def _set_chunks(self, data, max_size=3e6, excldims=None):
         """Get ideal-ish chunks in a different way."""
+        if excldims is None:
+            excldims = self.chunk_excl
         shape = data.shape
         npoints = np.prod(shape)
         excl_n = [self.data_cfg[excldim] for excldim in excldims]
@@ -120,14 +160,37 @@ class InputData:
 
         self.chunk = chunks_out
 
-    def _load_one_file(self, var, file_var=None):
-        """Load a single netCDF file as an xarray.Dataset."""
-        cfg = self.data_cfg
-        vname = cfg[var]
+    def _canonical_order(self, data):
+        """
+        Put latitude and vertical level of `data` into increasing order.
+
+        Parameters
+        ----------
+        data : :class:`xarray.DataArray`
+            Input data, with any of the latitude or level dimensions from the data
+            configuration
+
+        Returns
+        -------
+        data : :class:`xarray.DataArray`
+            `data`, reversed along latitude and level dimensions which decrease, so
+            metrics can assume both increase with index
+
+        """
+        _rev = {}
+        for cvar in ['lat', 'lev']:
+            dim = self.data_cfg[cvar]
+            if dim in data.dims and data[dim].shape[0] > 1:
+                if data[dim][0] > data[dim][-1]:
+                    _rev[dim] = slice(None, None, -1)
+
+        if _rev:
+            data = data.isel(**_rev)
+        return data
 
-        # Use this to set the file variable name (look for uwnd in ipv file)
-        if file_var is None:
-            file_var = var
+    def _open_file(self, file_var):
+        """Open the netCDF file containing `file_var` as an xarray.Dataset."""
+        cfg = self.data_cfg
 
         # Format the name of the file, join it with the path, open it
         try:
@@ -141,8 +204,30 @@ class InputData:
             nc_file = xr.open_dataset(os.path.join(cfg['path'], file_name))
         except FileNotFoundError:
             nc_file = package_data(cfg['path'], file_name)
+        return nc_file
 
-        self.in_data[var] = nc_file[vname].sel(**self.sel)
+    def _load_one_file(self, var, file_var=None):
+        """Load a single netCDF file as an xarray.Dataset."""
+        cfg = self.data_cfg
+        # Variables computed here (e.g. tropopause) use their own name in the IPV file
+        vname = cfg.get(var, var)
+
+        # Use this to set the file variable name (look for uwnd in ipv file)
+        if file_var is None:
+            file_var = var
+        nc_file = self._open_file(file_var)
+
+        def _select():
+            # Not all variables have every dimension (e.g. tropopause has no level)
+            data = nc_file[vname].sel(**{dim: self.sel[dim] for dim in self.sel
+                                         if dim in nc_file[vname].dims})
+            if self.lat_band is not None and cfg['lat'] in data.dims:
+                # Latitude band is selected as the file is read, so the rest is not
+                lat_idx = self._lat_index(data[cfg['lat']].values, self.lat_halo)
+                data = data.isel(**{cfg['lat']: lat_idx})
+            return data
+
+        self.in_data[var] = _select()
         _fails = 0
         while self.in_data[var][cfg['time']].shape[0] == 0 and _fails < 15:
             # Update the time slice so that it covers potential mis-match
@@ -152,7 +237,7 @@ class InputData:
             _day = dt.timedelta(hours=23)
             self.sel[cfg['time']] = slice(self.sel[cfg['time']].start,
                                           self.sel[cfg['time']].stop + _day)
-            self.in_data[var] = nc_file[vname].sel(**self.sel)
+            self.in_data[var] = _select()
             self.props.log.info('UPDATING TIME SLICE BY 1 DAY %s',
                                 (self.sel[cfg['time']].stop
                                  .strftime('%Y-%m-%d %HZ')))
@@ -160,6 +245,13 @@ class InputData:
             # Iterate, but don't get stuck here
             _fails += 1
 
+        # Reverse any decreasing coordinates while the file is still lazily loaded, so
+        # the reversal is done on read rather than as negative strides in dask chunks
+        self.in_data[var] = self._canonical_order(self.in_data[var])
+
+        if self.precision is not None:
+            self.in_data[var] = self.in_data[var].astype(self.precision)
+
         if all([self.chunk[var] is None for var in self.chunk]):
             self._set_chunks(self.in_data[var])
 
@@ -205,6 +297,17 @@ class InputDataSTJPV(InputData):
     """
     load_vars = ['uwnd', 'vwnd', 'tair', 'epv', 'ipv']
 
+    # Horizontal derivatives for IPV exchange halos between chunks, and the metric
+    # loads each hemisphere, so only the vertical must be in one chunk
+    chunk_excl = ('lev', )
+
+    # Centred latitude derivatives for IPV need one point beyond each edge of the band
+    lat_halo = 1
+
+    # Thermal tropopause variables, computed with IPV if `tropopause` is set in the run
+    # configuration
+    trop_vars = ['trop_pres', 'trop_theta']
+
     def __init__(self, props, date_s=None, date_e=None):
         """Initialize InputData object, using JetFindRun class."""
         super(InputDataSTJPV, self).__init__(props, date_s, date_e)
@@ -215,12 +318,94 @@ class InputDataSTJPV(InputData):
         self.out_data = {'uwnd': None, 'ipv': None}
         self.th_lev = None
 
+        # Grid metric factors (:class:`~STJ_PV.utils.GridGeometry`) used to compute IPV
+        self.geometry = None
+
+        # The metric only uses min_lat to max_lat in each hemisphere, so only that band
+        # is loaded, computed and stored. Unless the bounds are of mixed sign, then the
+        # metric uses them as they are, so everything is loaded
+        lat_bnds = [props.config['min_lat'], props.config['max_lat']]
+        if np.sign(lat_bnds[0]) * np.sign(lat_bnds[1]) >= 0:
+            self.lat_band = tuple(sorted(np.abs(lat_bnds).tolist()))
+        # Indices of the loaded latitudes within the band, without the halo
+        self.lat_keep = None
+
+        # Thermal tropopause is computed from temperature on pressure levels only
+        self.tropopause = props.config.get('tropopause', False)
+        if self.tropopause and self.data_cfg['ztype'] != 'pres':
+            self.props.log.info('THERMAL TROPOPAUSE ONLY FOR PRESSURE LEVEL INPUT')
+            self.tropopause = False
+
     def _find_pv_update(self):
         """Determine if PV needs to be computed/re-computed."""
         pv_file_name = (self.data_cfg['file_paths']['ipv']
                         .format(year=self.year))
         pv_file = os.path.join(self.data_cfg['wpath'], pv_file_name)
-        return self.props.config['update_pv'] or not os.path.exists(pv_file)
+        if self.props.config['update_pv'] or not os.path.exists(pv_file):
+            return True
+
+        # Files without a latitude band cover the whole globe
+        lat_band = self.lat_band if self.lat_band is not None else (0.0, 90.0)
+        with xr.open_dataset(pv_file) as pv_data:
+            file_band = pv_data.attrs.get('lat_band', [0.0, 90.0])
+            if file_band[0] > lat_band[0] or file_band[1] < lat_band[1]:
+                self.props.log.info('IPV FILE LATITUDE BAND %s DOES NOT COVER %s',
+                                    file_band, lat_band)
+                return True
+
+            # Tropopause is wanted, but might not have been computed with existing IPV
+            return self.tropopause and not all(var in pv_data for var in self.trop_vars)
+
+    def _hybrid_pres(self):
+        """
+        Compute pressure on hybrid sigma-pressure model levels.
+
+        Returns
+        -------
+        pres : :class:`xarray.DataArray`
+            Pressure [Pa] ``(hyam * p0 + hybm * ps) * pfac``, same dimensions as air
+            temperature. This is computed for each chunk of surface pressure, as needed
+
+        Notes
+        -----
+        The hybrid A and B coefficients are read from the air temperature file, and
+        selected and ordered the same way along the vertical. If `p0` is not in the
+        data configuration, A coefficients are assumed to be in the same units as `ps`
+
+        """
+        cfg = self.data_cfg
+        if 'ps' not in self.in_data:
+            self._load_one_file('ps')
+
+        tair = self.in_data['tair']
+        nc_file = self._open_file('tair')
+        hyam, hybm = [
+            self._canonical_order(nc_file[cfg[name]].sel(
+                **{cfg['lev']: self.sel[cfg['lev']]}
+            )).load() for name in ['hyam', 'hybm']
+        ]
+        pres = (hyam * cfg.get('p0', 1.0) + hybm * self.in_data['ps']) * cfg['pfac']
+
+        # Drop coordinates the coefficients might have beyond the level
+        pres = pres.reset_coords(drop=True).assign_coords({cfg['lev']: tair[cfg['lev']]})
+        return pres.astype(tair.dtype).transpose(*tair.dims)
+
+    def _calc_tropopause(self, dimvars):
+        """Compute thermal tropopause pressure and potential temperature."""
+        self.props.log.info('COMPUTING THERMAL TROPOPAUSE')
+        trop_temp, trop_pres = utils.xr_get_tropopause(self.in_data['tair'],
+                                                       dimvars=dimvars,
+                                                       pfac=self.data_cfg['pfac'])
+        trop_theta = trop_temp * (100000.0 / trop_pres) ** utils.KPPA
+
+        self.out_data['trop_pres'] = trop_pres.assign_attrs(
+            {'units': 'Pa', 'standard_name': 'tropopause_air_pressure',
+             'descr': 'WMO lapse rate tropopause pressure'}
+        )
+        self.out_data['trop_theta'] = trop_theta.assign_attrs(
+            {'units': 'K', 'standard_name': 'tropopause_air_potential_temperature',
+             'descr': 'WMO lapse rate tropopause potential temperature'}
+        )
 
     def _calc_ipv(self):
         # Shorthand for configuration dictionary
@@ -229,38 +414,50 @@ class InputDataSTJPV(InputData):
         if not self.in_data:
             self._load_data()
         self.props.log.info('Starting IPV calculation')
+        self.geometry = utils.grid_geometry(self.in_data['uwnd'][cfg['lat']].values,
+                                            self.in_data['uwnd'][cfg['lon']].values)
         # calculate IPV
-        if cfg['ztype'] == 'pres':
+        if cfg['ztype'] in ['pres', 'hybrid']:
+            if cfg['ztype'] == 'hybrid':
+                # Pressure of each point on model levels, data aren't interpolated to
+                # pressure levels, but straight to theta levels
+                self.props.log.info('USING HYBRID MODEL LEVELS')
+                pres = self._hybrid_pres()
+            else:
+                pres = None
+
             if 'epv' not in self.in_data:
                 self.props.log.info('USING U, V, T TO COMPUTE IPV')
                 ipv, _, uwnd = utils.xripv(self.in_data['uwnd'],
                                            self.in_data['vwnd'],
                                            self.in_data['tair'],
                                            dimvars=dimvars,
-                                           th_levels=self.props.th_levels
+                                           th_levels=self.props.th_levels,
+                                           geom=self.geometry,
+                                           pres=pres,
+                                           pfac=cfg['pfac']
                                            )
 
             else:
                 self.props.log.info('USING ISOBARIC PV TO COMPUTE IPV')
-                thta = utils.xrtheta(self.in_data['tair'], pvar=cfg['lev'])
-                ipv = utils.xrvinterp(self.in_data['epv'], thta,
-                                      self.props.th_levels,
-                                      levname=cfg['lev'],
-                                      newlevname=cfg['lev'])
-
-                uwnd = utils.xrvinterp(self.in_data['uwnd'], thta,
-                                       self.props.th_levels,
-                                       levname=cfg['lev'],
-                                       newlevname=cfg['lev'])
+                ipv, uwnd = utils.xrepv_theta(self.in_data['epv'],
+                                              self.in_data['uwnd'],
+                                              self.in_data['tair'],
+                                              dimvars=dimvars,
+                                              th_levels=self.props.th_levels,
+                                              pres=pres, pfac=cfg['pfac'])
 
             self.out_data['ipv'] = ipv
             self.out_data['uwnd'] = uwnd
 
             self.th_lev = self.props.th_levels
 
+            if self.tropopause:
+                self._calc_tropopause(dimvars)
+
         elif cfg['ztype'] == 'theta':
             ipv = utils.xripv_theta(self.in_data['uwnd'], self.in_data['vwnd'],
-                                    self.in_data['pres'], dimvars)
+                                    self.in_data['pres'], dimvars, geom=self.geometry)
             self.out_data['ipv'] = ipv
             self.out_data['uwnd'] = self.in_data['uwnd']
 
@@ -273,6 +470,12 @@ class InputDataSTJPV(InputData):
 
         self.out_data['ipv'] = self.out_data['ipv'].assign_attrs(ipv_attrs)
         self.out_data['uwnd'] = self.out_data['uwnd'].assign_attrs(uwnd_attrs)
+
+        if self.lat_band is not None:
+            # Halo points were only needed for derivatives at the edges of the band
+            self.lat_keep = self._lat_index(self.in_data['uwnd'][cfg['lat']].values)
+            self.out_data = {var: data.isel(**{cfg['lat']: self.lat_keep})
+                             for var, data in self.out_data.items()}
         self.props.log.info('Finished calculating IPV')
 
     def _load_ipv(self):
@@ -280,6 +483,8 @@ class InputDataSTJPV(InputData):
         file_name = self.data_cfg['file_paths']['ipv'].format(year=self.year)
         in_file = os.path.join(self.data_cfg['wpath'], file_name)
         self.props.log.info("LOAD IPV FROM FILE: {}".format(in_file))
+        # IPV file has no halo, and nothing here is differentiated, so load just the band
+        self.lat_halo = 0
         self._load_one_file('ipv')
         try:
             # Check for uwind in the IPV file first
@@ -288,6 +493,10 @@ class InputDataSTJPV(InputData):
             # But fall back on the uwind file
             self._load_one_file('uwnd')
 
+        if self.tropopause:
+            for var in self.trop_vars:
+                self._load_one_file(var, file_var='ipv')
+
         self.out_data = self.in_data
         self.th_lev = self.in_data['ipv'][self.data_cfg['lev']]
 
@@ -303,6 +512,15 @@ class InputDataSTJPV(InputData):
         dsout[self.data_cfg['lev']] = dsout[self.data_cfg['lev']].assign_attrs(
                 {'units': 'K', 'standard_name': 'potential_temperature'}
         )
+        if self.geometry is not None:
+            # Store the grid metric factors used to compute IPV alongside it
+            geometry = self.geometry.to_dataset(vlat=self.data_cfg['lat'],
+                                                vlon=self.data_cfg['lon'])
+            if self.lat_keep is not None:
+                geometry = geometry.isel(**{self.data_cfg['lat']: self.lat_keep})
+            dsout = dsout.merge(geometry.drop_vars(list(geometry.coords)))
+        if self.lat_band is not None:
+            dsout.attrs['lat_band'] = list(self.lat_band)
         dsout.encoding = dict((var, encoding) for var in dsout.data_vars)
         dsout.to_netcdf(pv_file, encoding=dsout.encoding)
         self.props.log.info('DONE WRITING PV FILE')
@@ -322,10 +540,11 @@ class InputDataSTJPV(InputData):
         else:
             self._load_ipv()
 
-        if self.th_lev[0] > self.th_lev[-1]:
-            for data_var in ['uwnd', 'ipv']:
-                self.out_data[data_var] = self.out_data[data_var][:, ::-1]
-            self.th_lev = self.th_lev[::-1]
+        # Computed IPV is on configured theta levels, which might be in any order. Levels
+        # are not split between chunks, so this reverses within each chunk
+        for data_var in ['uwnd', 'ipv']:
+            self.out_data[data_var] = self._canonical_order(self.out_data[data_var])
+        self.th_lev = self.out_data['ipv'][self.data_cfg['lev']]
 
         return xr.Dataset(self.out_data,
                           attrs={'cfg': self.data_cfg, 'year': self.year})
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+Column kernels used by the jet metrics and the tropopause calculation.
+
+Each kernel operates on a single column (1-D array) of data. There is a pure NumPy
+reference implementation of each, and an optional `Numba <https://numba.pydata.org>`_
+compiled implementation, which is used when it is selected and Numba is installed.
+
+The backend is selected with the ``kernels`` key in the run configuration, or the
+``STJPV_KERNELS`` environment variable (one of ``numpy`` or ``numba``), if neither
+is set, NumPy is used.
+
+The STJPV metric finds jets for all columns at once, without these kernels, they are
+used by its column-by-column debug path (``find_jet(debug=True)``), by the Davis and
+Birner metric, and by :func:`STJ_PV.utils.trop_lev_1d`.
+
+"""
+import os
+import warnings
+from types import SimpleNamespace
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+__author__ = "Penelope Maher, Michael Kelleher"
+
+ENV_VAR = 'STJPV_KERNELS'
+BACKENDS = ('numpy', 'numba')
+KERNEL_NAMES = ('trop_lev_1d', 'argrelmax', 'argrelmin', 'select_jet',
+                'equatorward_max')
+
+
+# ---------------------------------------------------------------------------------------
+# NumPy reference implementations
+# ---------------------------------------------------------------------------------------
+def trop_lev_1d(dtdz, d_z, thr=2.0):
+    """
+    Given 1D arrays for lapse rate and change in height, and a threshold, find tropopause.
+
+    Parameters
+    ----------
+    dtdz : array_like
+        1D array of lapse rate (in same units as `thr`, usually K km^-1
+    d_z : array_like
+        1D array of change of height from previous level, same shape as `dtdz`, in same
+        units as `dtdz` denominator units
+    thr : float
+        Lapse rate threshold for definition of tropopause, WMO/default is 2.0 K km^-1
+
+    Returns
+    -------
+    out_mask : array_like
+        1D array, same shape as `dtdz` and `d_z`, of booleans, `True` everywhere except
+        the tropopause level
+
+    """
+    lt_thr = dtdz < thr
+    lt_transition = np.append(False, np.logical_and(np.logical_not(lt_thr[:-1]),
+                                                    lt_thr[1:]))
+
+    start_idx = np.where(np.logical_and(lt_thr, lt_transition))[0]
+    out_mask = np.ones(d_z.shape[0], dtype=bool)
+
+    for idx in start_idx:
+        try:
+            max_in_2km = dtdz[idx:idx + abs(np.cumsum(d_z[idx:]) - 2.0).argmin()].max()
+        except ValueError:
+            continue
+
+        if max_in_2km <= thr:
+            out_mask[idx] = False
+
+    return out_mask
+
+
+def argrelmax(data):
+    """Find relative maxima of 1-D `data`, as :func:`scipy.signal.argrelmax`."""
+    return (np.where((data[1:-1] > data[:-2]) & (data[1:-1] > data[2:]))[0] + 1, )
+
+
+def argrelmin(data):
+    """Find relative minima of 1-D `data`, as :func:`scipy.signal.argrelmin`."""
+    return (np.where((data[1:-1] < data[:-2]) & (data[1:-1] < data[2:]))[0] + 1, )
+
+
+def select_jet(locs, ushear):
+    """
+    Select correct jet latitude given list of possible jet locations.
+
+    Parameters
+    ----------
+    locs : array_like
+        Array of indicies of jet locations
+    ushear : array_like
+        1D array along latitude axis of maximum surface - troposphere u-wind shear
+
+    Returns
+    -------
+    jet_loc : int
+        Index of the jet location, ``0`` if `locs` is empty, otherwise the location
+        with maximum `ushear`
+
+    """
+    if len(locs) == 0:
+        jet_loc = 0
+    elif len(locs) == 1:
+        jet_loc = locs[0]
+    else:
+        jet_loc = locs[np.argmax(ushear[locs])]
+    return jet_loc
+
+
+def equatorward_max(max_wind_surface, lat):
+    """
+    Find the index of the most equatorward local maximum of `max_wind_surface`.
+
+    Parameters
+    ----------
+    max_wind_surface : array_like
+        1D array of maximum wind in each column, on latitude
+    lat : array_like
+        1D array of latitude
+
+    Returns
+    -------
+    lat_idx : int
+        Index of the local maximum (where ``>=`` both neighbours) nearest the equator
+
+    """
+    # Neighbouring points, at the edges each point is its own neighbour
+    nlat = lat.shape[0]
+    wind_prev = max_wind_surface[np.maximum(np.arange(nlat) - 1, 0)]
+    wind_next = max_wind_surface[np.minimum(np.arange(nlat) + 1, nlat - 1)]
+
+    turning_points = np.where((max_wind_surface >= wind_prev) &
+                              (max_wind_surface >= wind_next))[0]
+    return turning_points[np.abs(lat[turning_points]).argmin()]
+
+
+_NUMPY_KERNELS = {name: globals()[name] for name in KERNEL_NAMES}
+
+
+# ---------------------------------------------------------------------------------------
+# Numba implementations, these must give the same results as the NumPy references
+# ---------------------------------------------------------------------------------------
+def _make_numba_kernels():
+    """Compile the Numba versions of each kernel, return them in a dict."""
+    jit = numba.njit(cache=True)
+
+    @jit
+    def _trop_lev_1d(dtdz, d_z, thr=2.0):
+        nlev = dtdz.shape[0]
+        out_mask = np.ones(d_z.shape[0], dtype=np.bool_)
+        for idx in range(1, nlev):
+            # Start of layer where lapse rate drops below threshold
+            if not (dtdz[idx] < thr and not dtdz[idx - 1] < thr):
+                continue
+
+            # Index of level closest to 2 km above, the first NaN if there is one
+            # (as numpy.argmin does)
+            z_sum = 0.0
+            best = np.inf
+            n_win = 0
+            for jdx in range(idx, nlev):
+                z_sum += d_z[jdx]
+                if np.isnan(z_sum):
+                    n_win = jdx - idx
+                    break
+                if abs(z_sum - 2.0) < best:
+                    best = abs(z_sum - 2.0)
+                    n_win = jdx - idx
+
+            if n_win == 0:
+                continue
+
+            max_in_2km = -np.inf
+            for jdx in range(idx, idx + n_win):
+                if np.isnan(dtdz[jdx]) or dtdz[jdx] > max_in_2km:
+                    max_in_2km = dtdz[jdx]
+                    if np.isnan(max_in_2km):
+                        break
+
+            if max_in_2km <= thr:
+                out_mask[idx] = False
+
+        return out_mask
+
+    @jit
+    def _argrelmax(data):
+        out = np.empty(max(data.shape[0] - 2, 0), dtype=np.int64)
+        n_out = 0
+        for idx in range(1, data.shape[0] - 1):
+            if data[idx] > data[idx - 1] and data[idx] > data[idx + 1]:
+                out[n_out] = idx
+                n_out += 1
+        return (out[:n_out], )
+
+    @jit
+    def _argrelmin(data):
+        out = np.empty(max(data.shape[0] - 2, 0), dtype=np.int64)
+        n_out = 0
+        for idx in range(1, data.shape[0] - 1):
+            if data[idx] < data[idx - 1] and data[idx] < data[idx + 1]:
+                out[n_out] = idx
+                n_out += 1
+        return (out[:n_out], )
+
+    @jit
+    def _select_jet(locs, ushear):
+        if locs.shape[0] == 0:
+            return 0
+        jet_loc = locs[0]
+        for loc in locs:
+            # NaN shear is selected, as it is by numpy.argmax
+            if np.isnan(ushear[loc]):
+                return loc
+            if ushear[loc] > ushear[jet_loc]:
+                jet_loc = loc
+        return jet_loc
+
+    @jit
+    def _equatorward_max(max_wind_surface, lat):
+        nlat = lat.shape[0]
+        lat_idx = -1
+        for idx in range(nlat):
+            if (max_wind_surface[idx] >= max_wind_surface[max(idx - 1, 0)] and
+                    max_wind_surface[idx] >= max_wind_surface[min(idx + 1, nlat - 1)]):
+                if lat_idx == -1 or abs(lat[idx]) < abs(lat[lat_idx]):
+                    lat_idx = idx
+        if lat_idx == -1:
+            raise ValueError('No local maximum of max_wind_surface')
+        return lat_idx
+
+    return {'trop_lev_1d': _trop_lev_1d, 'argrelmax': _argrelmax, 'argrelmin': _argrelmin,
+            'select_jet': _select_jet, 'equatorward_max': _equatorward_max}
+
+
+_NUMBA_KERNELS = {}
+
+
+def get_kernels(backend=None):
+    """
+    Get the set of column kernels for a backend.
+
+    Parameters
+    ----------
+    backend : string, optional
+        One of 'numpy' or 'numba'. Default is None, which uses the value of the
+        ``STJPV_KERNELS`` environment variable, or 'numpy' if that is not set
+
+    Returns
+    -------
+    kernels : :class:`types.SimpleNamespace`
+        Kernel functions as attributes, and `backend`, the name of the backend in use.
+        If Numba is requested but not installed, the NumPy kernels are returned
+
+    """
+    if backend is None:
+        backend = os.environ.get(ENV_VAR, 'numpy')
+    backend = backend.lower()
+
+    if backend not in BACKENDS:
+        raise ValueError('Kernel backend {} not one of {}'.format(backend, BACKENDS))
+
+    if backend == 'numba' and numba is None:
+        warnings.warn('Numba not available, using NumPy kernels')
+        backend = 'numpy'
+
+    if backend == 'numba':
+        if not _NUMBA_KERNELS:
+            _NUMBA_KERNELS.update(_make_numba_kernels())
+        kernels = _NUMBA_KERNELS
+    else:
+        kernels = _NUMPY_KERNELS
+
+    return SimpleNamespace(backend=backend, **kernels)
@@ -83,7 +83,11 @@ class JetFindRun:
             sys.exit(1)
 
         if self.data_cfg['single_var_file']:
-            for var in ['uwnd', 'vwnd', 'tair', 'omega']:   # TODO: Need to change list
+            _vars = ['uwnd', 'vwnd', 'tair', 'omega']   # TODO: Need to change list
+            if self.data_cfg['ztype'] == 'hybrid':
+                # Surface pressure is needed for the pressure on model levels
+                _vars.append('ps')
+            for var in _vars:
                 if var not in self.data_cfg['file_paths']:
                     # This replicates the path in 'all' so each variable points to it
                     # this allows for the same loop no matter if data is in multiple files
@@ -228,8 +232,7 @@ class JetFindRun:
                 data = self._get_data(_date_s, _date_e)
                 jet = self.metric(self, data)
 
-                for shemis in [True, False]:
-                    jet.find_jet(shemis)
+                jet.find_jets()
                 jet.compute()
 
                 if year == date_s.year:
@@ -240,8 +243,7 @@ class JetFindRun:
         else:
             data = self._get_data(date_s, date_e)
             jet_all = self.metric(self, data)
-            for shemis in [True, False]:
-                jet_all.find_jet(shemis)
+            jet_all.find_jets()
 
         if save:
             _out = None
@@ -387,6 +389,18 @@ def check_run_config(cfg_file):
             _, missing_opt = check_config_req(cfg_file, opt_keys, id_file=False)
             missing_optionals.append(missing_opt)
 
+        if config.get('precision', None) not in [None, 'float32', 'float64']:
+            print('PRECISION {} NOT ONE OF float32, float64'.format(config['precision']))
+            missing_req = True
+
+        if config.get('kernels', None) not in [None, 'numpy', 'numba']:
+            print('KERNELS {} NOT ONE OF numpy, numba'.format(config['kernels']))
+            missing_req = True
+
+        if not isinstance(config.get('tropopause', False), bool):
+            print('TROPOPAUSE {} NOT true OR false'.format(config['tropopause']))
+            missing_req = True
+
     return config, any([missing_req, all(missing_optionals)])
 
 
@@ -414,6 +428,16 @@ def check_data_config(cfg_file):
             _, miss_opts = check_config_req(cfg_file, opt_reqs)
             missing_optionals.append(miss_opts)
 
+        elif config['ztype'] == 'hybrid':
+            # hybrid level data needs hybrid coefficient and surface pressure names
+            opt_reqs = {'pfac': float, 'hyam': str, 'hybm': str, 'ps': str}
+            _, miss_opts = check_config_req(cfg_file, opt_reqs)
+            if 'ps' not in config['file_paths'] and 'all' not in config['file_paths']:
+                # Surface pressure file is its own entry, or the file of all variables
+                print('    MISSING: ps (OR all) IN file_paths FOR HYBRID LEVEL DATA')
+                miss_opts = True
+            missing_optionals.append(miss_opts)
+
         elif config['ztype'] not in ['pres', 'theta']:
             print('NO METHOD TO HANDLE {} level data'.format(config['ztype']))
             missing_optionals.append(True)
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Finite difference stencils along one axis of N-D data.
+
+Each stencil allocates its output once, then writes the interior (centred) and
+boundary (forward / backward) differences directly into it, rather than joining
+separately computed pieces. The ``xr_`` versions apply the same stencils to
+:class:`xarray.DataArray`, with either NumPy or dask data.
+
+"""
+import numpy as np
+import xarray as xr
+
+__author__ = "Penelope Maher, Michael Kelleher"
+
+
+def _slicer(axis, ndim):
+    """Return function making an N-D slice tuple, with [start:stop] along `axis`."""
+    def _slc(start=None, stop=None):
+        slc = [slice(None)] * ndim
+        slc[axis] = slice(start, stop)
+        return tuple(slc)
+    return _slc
+
+
+def diff_cfd(data, axis=-1, cyclic=False):
+    """
+    Calculate centered finite difference on a field along an axis with even spacing.
+
+    Parameters
+    ----------
+    data : array_like
+        N-D array of data of which to calculate the differences
+    axis : integer
+        Axis of `data` on which differences are calculated
+    cyclic : bool
+        Flag to indicate whether `data` is cyclic on `axis`
+
+    Returns
+    -------
+    diff : array_like
+        N-D array of central finite differences of `data` along `axis`, at the
+        ends of `axis` these are forward / backward differences unless `cyclic`
+
+    """
+    data = np.asarray(data)
+    slc = _slicer(axis, data.ndim)
+    diff = np.empty(data.shape, dtype=data.dtype)
+
+    # Equivalent to: diff[..., 1:-1] = data[..., 2:] - data[..., :-2] for axis == -1
+    np.subtract(data[slc(2, None)], data[slc(None, -2)], out=diff[slc(1, -1)])
+
+    if cyclic:
+        # Cyclic boundary in "East" and "West"
+        np.subtract(data[slc(1, 2)], data[slc(-1, None)], out=diff[slc(0, 1)])
+        np.subtract(data[slc(0, 1)], data[slc(-2, -1)], out=diff[slc(-1, None)])
+    else:
+        # Otherwise edges are forward/backward differences
+        np.subtract(data[slc(1, 2)], data[slc(0, 1)], out=diff[slc(0, 1)])
+        np.subtract(data[slc(-1, None)], data[slc(-2, -1)], out=diff[slc(-1, None)])
+
+    return diff
+
+
+def diffz(data, vcoord, axis=-1):
+    """
+    Calculate derivative of data on uneven levels.
+
+    Parameters
+    ----------
+    data : array_like
+        N-D array of input data to be differentiated
+    vcoord : array_like
+        Vertical coordinate, either 1D where ``vcoord.shape[0] == data.shape[axis]``
+        or N-D, broadcastable to `data`
+    axis : integer
+        Axis of `data` (and N-D `vcoord`) along which to differentiate
+
+    Returns
+    -------
+    dxdz : array_like
+        N-D array of d(data)/d(vcoord), same shape as input `data`. Centred
+        differences in the interior, forward / backward at the ends of `axis`
+
+    """
+    data = np.asarray(data)
+    vcoord = np.asarray(vcoord)
+    axis = axis % data.ndim
+    slc = _slicer(axis, data.ndim)
+
+    if vcoord.ndim == 1 and data.ndim > 1:
+        # Broadcast along matching axis, same as [None, :, None, None] for axis=1, ndim=4
+        bcast = [np.newaxis] * data.ndim
+        bcast[axis] = slice(None)
+        vcoord = vcoord[tuple(bcast)]
+
+    d_z = np.diff(vcoord, axis=axis)
+    d_z2 = d_z[slc(None, -1)]
+    d_z1 = d_z[slc(1, None)]
+
+    dtype = np.result_type(data.dtype, vcoord.dtype, np.float16)
+    dxdz = np.empty(data.shape, dtype=dtype)
+
+    # Central difference for uneven levels, accumulated into the interior of dxdz
+    # with a single temporary array
+    inner = dxdz[slc(1, -1)]
+    np.multiply(d_z2, data[slc(2, None)], out=inner)
+    _tmp = (d_z1 - d_z2) * data[slc(1, -1)]
+    inner += _tmp
+    np.multiply(d_z1, data[slc(None, -2)], out=_tmp)
+    inner -= _tmp
+    inner /= 2.0 * d_z1 * d_z2
+
+    # Do forward difference at 0th level [:, 1, :, :] - [:, 0, :, :]
+    np.subtract(data[slc(1, 2)], data[slc(0, 1)], out=dxdz[slc(0, 1)])
+    dxdz[slc(0, 1)] /= d_z[slc(0, 1)]
+
+    # Do backward difference at Nth level
+    np.subtract(data[slc(-1, None)], data[slc(-2, -1)], out=dxdz[slc(-1, None)])
+    dxdz[slc(-1, None)] /= d_z[slc(-1, None)]
+
+    return dxdz
+
+
+def xr_diff_cfd(data, dim='lon', cyclic=False):
+    """
+    Calculate centered finite difference along a dimension with even spacing.
+
+    Parameters
+    ----------
+    data : :class:`xarray.DataArray`
+        N-D array of data of which to calculate the differences
+    dim : string
+        Dimension name of `data` along which differences are calculated
+    cyclic : bool
+        Flag to indicate whether `data` is cyclic on `dim`
+
+    Returns
+    -------
+    diff : :class:`xarray.DataArray`
+        N-D array of central finite differences of `data` along `dim`
+
+    Notes
+    -----
+    If `data` is a dask array, it may be chunked along `dim`. Each chunk is extended
+    by one point from each of its neighbours (or the opposite end of `dim` if
+    `cyclic`) so that each chunk is differenced independently.
+
+    """
+    axis = data.get_axis_num(dim)
+
+    if isinstance(data.data, np.ndarray):
+        diff = diff_cfd(data.data, axis=axis, cyclic=cyclic)
+    else:
+        # Differences on the edge of each chunk (after the halo points are added) are
+        # forward / backward, these are trimmed off, except at the ends of `dim` when
+        # not cyclic, where no halo is added, and the forward / backward differences
+        # are what we want anyway
+        if cyclic:
+            boundary = 'periodic'
+        else:
+            boundary = 'none'
+        diff = data.data.map_overlap(diff_cfd, depth={axis: 1}, boundary={axis: boundary},
+                                     dtype=data.dtype, axis=axis, cyclic=False)
+
+    return data.copy(data=diff)
+
+
+def xrdiffz(data, vcoord, dim='lev'):
+    """
+    Calculate derivative along a dimension for data on uneven levels.
+
+    Parameters
+    ----------
+    data : :class:`xarray.DataArray`
+        N-D array of input data to be differentiated
+    vcoord : :class:`xarray.DataArray`
+        Vertical coordinate, 1D or N-D, with dimension `dim`
+    dim : string
+        Vertical dimension name, must exist in both `data` and `vcoord`
+
+    Returns
+    -------
+    dxdz : :class:`xarray.DataArray`
+        N-D array of d(data)/d(vcoord), same shape and dimensions as input `data`
+
+    """
+    dtype = np.result_type(data.dtype, vcoord.dtype, np.float16)
+
+    if vcoord.ndim == 1:
+        # Differentiate along `dim` where it is, rather than moving it to the last axis
+        axis = data.get_axis_num(dim)
+        if isinstance(data.data, np.ndarray):
+            dxdz = diffz(data.data, vcoord.values, axis=axis)
+        else:
+            dxdz = data.data.rechunk({axis: -1}).map_blocks(diffz, vcoord.values,
+                                                            axis=axis, dtype=dtype)
+        return data.copy(data=dxdz)
+
+    dxdz = xr.apply_ufunc(
+        diffz,
+        data,
+        vcoord,
+        input_core_dims=[[dim], [dim]],
+        output_core_dims=[[dim]],
+        dask='parallelized',
+        output_dtypes=[dtype],
+        dask_gufunc_kwargs={'allow_rechunk': True},
+        kwargs={'axis': -1},
+    )
+    return dxdz.transpose(*data.dims)
@@ -4,14 +4,13 @@ import subprocess
 import yaml
 import numpy as np
 import numpy.polynomial as poly
-from scipy import signal as sig
-from scipy.signal import argrelextrema
 
 from netCDF4 import num2date, date2num
 import pandas as pd
 import xarray as xr
 from xarray import ufuncs as xu
 from STJ_PV import utils
+from STJ_PV import kernels
 
 try:
     from eddy_terms import Kinetic_Eddy_Energies
@@ -45,11 +44,14 @@ class STJMetric:
         self.data = data
         self.props = props.config
         self.log = props.log
+        self.kernels = kernels.get_kernels(self.props.get('kernels', None))
         self.out_data = {}
         self.time = None
         self.hemis = None
         self.debug_data = {}
         self.plot_idx = 0
+        # Zonal wind on the lowest valid level, and the dataset it was computed from
+        self._uwnd_sfc = (None, None)
 
     def _drop_vars(self, out_var):
         """Drop coordinate variables that may not match."""
@@ -110,7 +112,7 @@ class STJMetric:
         -------
         extrema : function
             Function used to identify extrema in meridional PV gradient, either
-            :func:`scipy.signal.argrelmax` if SH, or :func:`scipy.signal.argrelmin`
+            :func:`STJ_PV.kernels.argrelmax` if SH, or :func:`STJ_PV.kernels.argrelmin`
             for NH
 
         lat : array_like
@@ -123,20 +125,42 @@ class STJMetric:
 
         if shemis:
             self.hemis = self.data[self.data.cfg['lat']] < 0
-            extrema = sig.argrelmax
+            extrema = self.kernels.argrelmax
             hem_s = 'sh'
             if lats[0] > 0 and lats[1] > 0:
                 # Lats are positive, multiply by -1 to get positive for SH
                 lats = [-lats[0], -lats[1]]
         else:
             self.hemis = self.data[self.data.cfg['lat']] > 0
-            extrema = sig.argrelmin
+            extrema = self.kernels.argrelmin
             hem_s = 'nh'
             if lats[0] < 0 and lats[1] < 0:
                 # Lats are negative, multiply by -1 to get positive for NH
                 lats = [-lats[0], -lats[1]]
 
-        return extrema, tuple(lats), hem_s
+        return extrema, tuple(sorted(lats)), hem_s
+
+    def find_jets(self):
+        """Find the jet in both hemispheres, with :py:meth:`~find_jet` for each."""
+        for shemis in [True, False]:
+            self.find_jet(shemis)
+
+    def surface_wind(self):
+        """
+        Get zonal wind on the lowest valid level of each column of `self.data`.
+
+        Returns
+        -------
+        uwnd_sfc : :class:`xarray.DataArray`
+            Zonal wind on the lowest level where it is valid, with the vertical dimension
+            dropped, this is computed once for each dataset and then reused
+
+        """
+        data, uwnd_sfc = self._uwnd_sfc
+        if data is not self.data:
+            uwnd_sfc = utils.xrlowest_valid(self.data.uwnd, self.data.cfg['lev']).load()
+            self._uwnd_sfc = (self.data, uwnd_sfc)
+        return uwnd_sfc
 
     def compute(self):
         """Compute all dask arrays in `self.out_data`."""
@@ -186,16 +210,19 @@ class STJPV(STJMetric):
             self.pfit = poly.chebyshev.chebfit
             self.pder = poly.chebyshev.chebder
             self.peval = poly.chebyshev.chebval
+            self.pvander = poly.chebyshev.chebvander
 
         elif self.props['poly'].lower() in ['leg', 'legen', 'legendre']:
             self.pfit = poly.legendre.legfit
             self.pder = poly.legendre.legder
             self.peval = poly.legendre.legval
+            self.pvander = poly.legendre.legvander
 
         elif self.props['poly'].lower() in ['poly', 'polynomial']:
             self.pfit = poly.polynomial.polyfit
             self.pder = poly.polynomial.polyder
             self.peval = poly.polynomial.polyval
+            self.pvander = poly.polynomial.polyvander
 
         # Initialise latitude & theta output dicts
         self.out_data = {}
@@ -261,17 +288,16 @@ class STJPV(STJMetric):
             Hemisphere index 0 for SH, 1 for NH
         extrema : function
             Function used to identify extrema in meridional PV gradient, either
-            :func:`scipy.signal.argrelmax` if SH, or :func:`scipy.signal.argrelmin`
+            :func:`STJ_PV.kernels.argrelmax` if SH, or :func:`STJ_PV.kernels.argrelmin`
             for NH
 
         """
         lats = (self.props['min_lat'], self.props['max_lat'])
-        lat_dec = self.data[self.data.cfg['lat']][0] > self.data[self.data.cfg['lat']][-1]
 
         if shemis:
             _lstart = -90
             _lend = 0
-            extrema = sig.argrelmax
+            extrema = self.kernels.argrelmax
             hem_s = 'sh'
             if lats[0] > 0 and lats[1] > 0:
                 # Lats are positive, multiply by -1 to get positive for SH
@@ -279,19 +305,17 @@ class STJPV(STJMetric):
         else:
             _lstart = 0
             _lend = 90
-            extrema = sig.argrelmin
+            extrema = self.kernels.argrelmin
             hem_s = 'nh'
             if lats[0] < 0 and lats[1] < 0:
                 # Lats are negative, multiply by -1 to get positive for NH
                 lats = (-lats[0], -lats[1])
 
-        if lat_dec:
-            _lstart, _lend = _lend, _lstart
-
+        # Latitude increases with index (see InputData._canonical_order)
         self.hemis = {self.data.cfg['lat']: slice(_lstart, _lend)}
-        return extrema, lats, hem_s
+        return extrema, tuple(sorted(lats)), hem_s
 
-    def isolate_pv(self, pv_lev):
+    def isolate_pv(self, pv_lev, flip_sh=False):
         """
         Get the potential temperature, zonal wind and zonal wind shear for a PV level.
 
@@ -300,6 +324,10 @@ class STJPV(STJMetric):
         pv_lev : float
             PV value (for a particular hemisphere, >0 for NH, <0 for SH) on which to
             interpolate potential temperature and wind
+        flip_sh : bool, optional
+            If True, PV is multiplied by -1 in the SH (where it is negative), so that
+            `pv_lev` (>0) is found in both hemispheres of `self.hemis` at once.
+            Default is False
         theta_bnds : tuple, optional
             Start and end theta levels to use for interpolation. Default is None,
             if None, use all theta levels, otherwise restrict so
@@ -333,26 +361,28 @@ class STJPV(STJMetric):
         # selection will raise an error
         _latlev = lev_subset.copy()
         _latlev.update(self.hemis)
-        _pv = self.data.ipv.sel(**_latlev).load()
+        _pv = self.data.ipv.sel(**_latlev)
+        if flip_sh:
+            vlat = self.data.cfg['lat']
+            _pv = _pv * xr.where(_pv[vlat] < 0, -1, 1).astype(_pv.dtype)
+        _pv = _pv.load()
         _uwnd = self.data.uwnd.sel(**_latlev).load()
-        self.log.info('     COMPUTING THETA ON %.1e', pv_lev)
-        theta_xpv = utils.xrvinterp(
-            self.data[lev_name].sel(**lev_subset),
-            _pv,
-            pv_lev,
-            levname=lev_name,
-            newlevname='pv',
-        ).load()
-
-        self.log.info('     COMPUTING UWND ON %.1e', pv_lev)
-        uwnd_xpv = utils.xrvinterp(
-            _uwnd, _pv, pv_lev, levname=lev_name, newlevname='pv'
-        ).load()
+        # Potential temperature increases with index, so the PV surface search
+        # starts at the top of the column
+        _theta = self.data[lev_name].sel(**lev_subset)
+
+        self.log.info('     COMPUTING THETA, UWND ON %.1e', pv_lev)
+        # PV is decreasing with height in the southern hemisphere, where pv_lev < 0
+        _, (theta_xpv, uwnd_xpv) = utils.xrfirst_crossing(
+            [_theta, _uwnd], _pv, pv_lev, levname=lev_name, decreasing=pv_lev < 0
+        )
+        theta_xpv = theta_xpv.load()
+        uwnd_xpv = uwnd_xpv.load()
 
         self.log.info('     COMPUTING SHEAR FROM %.1e', pv_lev)
-        ushear = self._get_max_shear(uwnd_xpv.squeeze(dim='pv')).load()
+        ushear = self._get_max_shear(uwnd_xpv).load()
 
-        return theta_xpv.squeeze(dim='pv'), uwnd_xpv.squeeze(dim='pv'), ushear
+        return theta_xpv, uwnd_xpv, ushear
 
     def find_jet(self, shemis=True, debug=False):
         """
@@ -373,50 +403,104 @@ class STJPV(STJMetric):
         else:
             pv_lev = -1 * np.array([self.pv_lev]) * 1e-6
 
-        extrema, lats, hem_s = self.set_hemis(shemis)
+        self.set_hemis(shemis)
         self.log.info('COMPUTING THETA/UWND ON %.1f PVU', pv_lev * 1e6)
         # Get theta on PV==pv_level
         theta_xpv, uwnd_xpv, ushear = self.isolate_pv(pv_lev)
 
+        return self._jet_position(theta_xpv, uwnd_xpv, ushear, shemis, debug=debug)
+
+    def find_jets(self):
+        """
+        Find the subtropical jet in both hemispheres, loading and isolating PV once.
+
+        Notes
+        -----
+        PV and zonal wind of both hemispheres are selected and loaded together, with the
+        sign of PV flipped in the SH, so the PV surface is found in both hemispheres
+        with one computation. The jet is then located in each hemisphere as in
+        :py:meth:`~find_jet`. If the latitude bands of each hemisphere meet at the
+        equator, the hemispheres can't be found together, so they are found separately.
+
+        """
+        vlat = self.data.cfg['lat']
+        lats = {shemis: self.set_hemis(shemis)[1] for shemis in [True, False]}
+        if not lats[True][1] < 0 < lats[False][0]:
+            super(STJPV, self).find_jets()
+            return
+
+        lat = self.data[vlat]
+        in_band = ((lat >= lats[True][0]) & (lat <= lats[True][1]) |
+                   (lat >= lats[False][0]) & (lat <= lats[False][1]))
+        self.hemis = {vlat: lat[in_band].values}
+
+        pv_lev = np.array([abs(self.pv_lev)]) * 1e-6
+        self.log.info('COMPUTING THETA/UWND ON %.1f PVU FOR BOTH HEMISPHERES',
+                      pv_lev * 1e6)
+        theta_xpv, uwnd_xpv, ushear = self.isolate_pv(pv_lev, flip_sh=True)
+
+        for shemis in [True, False]:
+            self._jet_position(theta_xpv, uwnd_xpv, ushear, shemis)
+
+    def _jet_position(self, theta_xpv, uwnd_xpv, ushear, shemis, debug=False):
+        """
+        Find jet position, intensity and theta level from data on the PV surface.
+
+        Parameters
+        ----------
+        theta_xpv, uwnd_xpv, ushear : :class:`xarray.DataArray`
+            Potential temperature, zonal wind and zonal wind shear on the PV surface,
+            from :py:meth:`~isolate_pv`, which must include the hemisphere's latitudes
+        shemis : logical
+            If True, find jet position in Southern Hemisphere,
+            If False, find N.H. jet
+        debug : logical, optional
+            Enter debug mode if true, returns d(theta) / d(lat) values,
+            polynomial fit, and jet latitude
+
+        """
+        extrema, lats, hem_s = self.set_hemis(shemis)
+
         # Shortcut for latitude variable name, since it's used a lot
         vlat = self.data.cfg['lat']
 
         # Restrict theta and shear between our min / max latitude from config file
         # that was processed by self.set_hemis
         _theta = theta_xpv.sel(**{vlat: slice(*lats)})
-        if _theta[vlat].shape[0] == 0:
-            # If the selection is empty along the latitude axis, that means
-            # the selection is the wrong way around, so flip it before moving on
-            lats = lats[::-1]
-            _theta = theta_xpv.sel(**{vlat: slice(*lats)})
         _shear = ushear.sel(**{vlat: slice(*lats)})
 
         self.log.info('COMPUTING JET POSITION FOR %s in %d', hem_s, self.data.year)
-        # Set up computation of all the jet latitudes at once using self.find_single_jet
+        # Set up computation of all the jet latitudes at once using self.locate_jets
         # The input_core_dims is a list of lists, that tells xarray/dask that the
-        # arguments _theta, _theta.lat, and _shear are passed to self.find_single_jet
-        # with that dimension intact. The kwargs argument passes keyword args to the
-        # self.find_single_jet
+        # arguments _theta and _shear are passed to self.locate_jets with that
+        # dimension intact, and moved to the last axis. The kwargs argument passes
+        # keyword args to the self.locate_jets
         if not debug:
+            # Same extrema as from self.set_hemis, maxima in the SH, minima in the NH
+            if shemis:
+                comparator = np.greater
+            else:
+                comparator = np.less
             jet_lat = xr.apply_ufunc(
-                self.find_single_jet,
+                self.locate_jets,
                 _theta,
-                _theta[vlat],
                 _shear,
-                input_core_dims=[[vlat], [vlat], [vlat]],
-                vectorize=True,
+                input_core_dims=[[vlat], [vlat]],
                 dask='parallelized',
-                kwargs={'extrema': extrema},
+                output_dtypes=[_theta[vlat].dtype],
+                kwargs={'lat': _theta[vlat].values, 'comparator': comparator},
             )
         else:
             dtheta, theta_fit, jet_lat = self._debug_jet_loop(_theta, _shear, extrema)
 
-        # Select the data for level and intensity by the latitudes generated
-        jet_theta = theta_xpv.sel(**{vlat: jet_lat})
-        jet_intens = uwnd_xpv.sel(**{vlat: jet_lat})
+        # Select the data for level and intensity by the latitudes generated, where
+        # jet_lat == 0.0 (set whenever there is invalid data for a particular cell) might
+        # not be on the grid, so select the first latitude there, it is masked below
+        _jet_lat = jet_lat.where(jet_lat != 0.0, _theta[vlat].values[0])
+        jet_theta = theta_xpv.sel(**{vlat: _jet_lat})
+        jet_intens = uwnd_xpv.sel(**{vlat: _jet_lat})
 
-        # This masks our xarrays of intrest where the jet_lat == 0.0, which is set
-        # whenever there is invalid data for a particular cell
+        # This masks our xarrays of intrest where the jet_lat == 0.0
         jet_intens = jet_intens.where(jet_lat != 0.0)
         jet_theta = jet_theta.where(jet_lat != 0.0)
         jet_lat = jet_lat.where(jet_lat != 0.0)
@@ -492,22 +576,51 @@ class STJPV(STJMetric):
         """Get maximum wind-shear between surface and PV surface."""
         # Our zonal wind data is on isentropic levels. Lower levels are bound to be below
         # the surface in some places, so we need to use the lowest valid wind level as
-        # the surface, so do some magic to make that happen.
-        _lev = self.data.cfg['lev']
-        if self.data[_lev].shape[0] != self.data.chunks[_lev][0]:
-            # re-chunk wind to ensure continuity along vertical axis
-            self.data = self.data.chunk({_lev: -1})
-
-        uwnd_sfc = xr.apply_ufunc(
-            lowest_valid,
-            self.data.uwnd,
-            input_core_dims=[[self.data.cfg['lev']]],
-            vectorize=True,
-            dask='parallelized',
-            output_dtypes=[float],
-        )
+        # the surface, which is the same for both hemispheres so it is found once
+        return uwnd_xpv - self.surface_wind().sel(**self.hemis)
 
-        return uwnd_xpv - uwnd_sfc.sel(**self.hemis)
+    def locate_jets(self, theta_xpv, ushear, lat, comparator):
+        """
+        Find jet locations for all profiles of theta on latitude at once.
+
+        Parameters
+        ----------
+        theta_xpv : array_like
+            N-D array of theta on PV level, latitude is the last axis
+        ushear : array_like
+            N-D array of maximum surface - troposphere u-wind shear, same shape as
+            `theta_xpv`
+        lat : array_like
+            1D array of latitude, matching last axis of `theta_xpv`
+        comparator : function
+            Comparison which identifies extrema in meridional theta gradient (see
+            :func:`STJ_PV.utils.relative_extrema`), :func:`numpy.greater` for maxima
+            in the SH, :func:`numpy.less` for minima in the NH
+
+        Returns
+        -------
+        jet_lat : array_like
+            (N-1)-D array of jet latitude, ``0`` where no `theta_xpv` is valid, or
+            there is no jet candidate
+
+        Notes
+        -----
+        The polynomial fits, and their derivatives, of all profiles are found together
+        with :func:`STJ_PV.utils.poly_deriv`. Then the jet is selected from the extrema
+        of each profile as in :py:meth:`~select_jet`, for all profiles at once.
+
+        """
+        dtheta = utils.poly_deriv(lat, theta_xpv, self.fit_deg, self.pvander, self.pder)
+        jet_cand = utils.relative_extrema(dtheta, comparator)
+
+        # Shear is -inf away from candidates, so the candidate with maximum shear is
+        # selected (or the first with NaN shear)
+        jet_loc = np.where(jet_cand, ushear, -np.inf).argmax(axis=-1)
+
+        # Profiles without valid data have no fit, and profiles without candidates
+        # have no jet, their latitude is 0 so they are masked
+        found = np.isfinite(dtheta[..., 0]) & jet_cand.any(axis=-1)
+        return np.where(found, lat[jet_loc], 0).astype(lat.dtype)
 
     def find_single_jet(self, theta_xpv, lat, ushear, extrema, debug=False):
         """
@@ -544,6 +657,9 @@ class STJPV(STJMetric):
             # none of the theta_xpv data is valid for this time/lon, so
             # set the output latitude to be 0, so it can be masked out
             out_lat = 0.0
+        elif len(jet_loc_all) == 0:
+            # No jet candidates, so no jet, this is masked out in the same way
+            out_lat = 0.0
         else:
             out_lat = lat[select]
 
@@ -573,7 +689,7 @@ class STJPV(STJMetric):
         Notes
         -----
         * If the list of locations is empty, return ``0`` as the location, this is
-          interpreted by :py:meth:`~find_jet` as missing.
+          interpreted by :py:meth:`~find_single_jet` as missing.
 
         * If the list of locations is exactly one return that location.
 
@@ -581,22 +697,7 @@ class STJPV(STJMetric):
           provided level and the dynamical tropopause.
 
         """
-        if len(locs) == 0:
-            # A jet has not been identified at this time/location, set the position
-            # to zero so it can be masked out when the zonal median is performed
-            jet_loc = 0
-
-        elif len(locs) == 1:
-            # This essentially converts a list of length 1 to a single int
-            jet_loc = locs[0]
-
-        elif len(locs) > 1:
-            # The jet location, if multiple peaks are identified, should be the one
-            # with maximum wind shear between the jet level and the surface
-            ushear_max = np.argmax(ushear[locs])
-            jet_loc = locs[ushear_max]
-
-        return jet_loc
+        return self.kernels.select_jet(np.asarray(locs, dtype=int), ushear)
 
 
 class STJDavisBirner(STJMetric):
@@ -646,17 +747,10 @@ class STJDavisBirner(STJMetric):
         _, hlats, hem_s = self.set_hemis(shemis)
         cfg = self.data.cfg
 
-        if self.data[cfg['lev']][0] > self.data[cfg['lev']][-1]:
-            subset = {cfg['lev']: slice(self.lower_p_level, self.upper_p_level)}
-        else:
-            subset = {cfg['lev']: slice(self.upper_p_level, self.lower_p_level)}
-
-        subset.update({cfg['lat']: slice(*hlats)})
+        # Pressure and latitude both increase with index
+        subset = {cfg['lev']: slice(self.upper_p_level, self.lower_p_level),
+                  cfg['lat']: slice(*hlats)}
         uwnd_p = self.data.uwnd.sel(**subset)
-        if uwnd_p[cfg['lat']].shape[0] == 0:
-            # Reverse order of lat selection if none are found
-            subset[cfg['lat']] = slice(*hlats[::-1])
-            uwnd_p = self.data.uwnd.sel(**subset)
 
         # Subtract the surface wind from the wind in 400-100 layer
         uwnd_p = uwnd_p - self.data.uwnd.sel(**{cfg['lev']: self.surf_p_level})
@@ -696,13 +790,8 @@ class STJDavisBirner(STJMetric):
         """
         max_wind_surface = np.max(uzonal, axis=0)
         # for the given maximum wind surface, find local
-        # maxima and then keep most equatorward.
-        turning_points = argrelextrema(max_wind_surface, np.greater_equal)[0]
-        turning_lats = lat[turning_points]
-
-        # Take the argmin of the absolute value of the latitudes, use that index
-        # This finds the most equatorward latitude, regardless of hemisphere
-        lat_idx = turning_points[np.abs(turning_lats).argmin()]
+        # maxima and then keep most equatorward, regardless of hemisphere
+        lat_idx = self.kernels.equatorward_max(max_wind_surface, lat)
 
         if lat_idx not in [0, 1, lat.shape[0] - 1, lat.shape[0]]:
             # If the selected index is away from the boundaries, interpolate using
@@ -801,12 +890,6 @@ class STJMaxWind(STJMetric):
         # Select the latitudes and level
         uwnd_hem = self.data.uwnd.sel(**_latlev_select)
 
-        if uwnd_hem[vlat].shape[0] == 0:
-            # This probably means that lat is decreasing with increasing index
-            # so swap the hemisphere latitudes around and re-try the selection
-            _latlev_select[vlat] = slice(*hlats[::-1])
-            uwnd_hem = self.data.uwnd.sel(**_latlev_select)
-
         # Find the maximum zonal mean zonal wind at the level set in config
         uwnd_max = uwnd_hem.argmax(dim=vlat)
 
@@ -1025,11 +1108,6 @@ class STJKangPolvani(STJMetric):
         )
 
 
-def lowest_valid(col):
-    """Given 1-D array find lowest (along axis) valid data."""
-    return col[np.isfinite(col).argmax()]
-
-
 def get_season(month):
     """Map month index to index of season [DJF -> 0, MAM -> 1, JJA -> 2, SON -> 3]."""
     seasons = np.array([0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0])
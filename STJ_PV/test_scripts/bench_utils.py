@@ -0,0 +1,445 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Benchmark numerical kernels in :py:mod:`STJ_PV.utils` against previous versions."""
+import argparse as arg
+import timeit
+import tracemalloc
+import warnings
+import dask
+import numpy as np
+import xarray as xr
+from scipy import interpolate as interp
+from STJ_PV import utils, stencils, kernels, thermal_tropopause
+
+__author__ = "Penelope Maher, Michael Kelleher"
+
+
+def legacy_vinterp(data, vcoord, vlevels):
+    """Loop-over-levels vertical interpolation, as :func:`utils.vinterp` used to be."""
+    if vcoord.ndim == 1 and data.ndim > 1:
+        v_dim = int(np.where(np.array(data.shape) == vcoord.shape[0])[0][0])
+        data_shape = list(data.shape)
+        data_shape[-1], data_shape[v_dim] = data_shape[v_dim], data_shape[-1]
+        vcoord = np.swapaxes(np.broadcast_to(vcoord, data_shape), -1, v_dim)
+
+    vcoord_shape = list(vcoord.shape)
+    vcoord_shape.pop(1)
+    valid = np.min([np.prod(vcoord_shape) - np.sum(np.isnan(vcoord[:, 0, ...])),
+                    np.prod(vcoord_shape) - np.sum(np.isnan(vcoord[:, -1, ...]))])
+
+    if np.sum(vcoord[:, 0, ...] > vcoord[:, -1, ...]) / valid > 0.80:
+        idx_gt, idx_lt = 1, 0
+    else:
+        idx_gt, idx_lt = 0, 1
+
+    if data.ndim >= vcoord.ndim:
+        out_shape = list(data.shape)
+    else:
+        out_shape = list(vcoord.shape)
+    out_shape[1] = vlevels.shape[0]
+    out_data = np.zeros(out_shape) + np.nan
+
+    for lev_idx, lev in enumerate(vlevels):
+        if idx_gt == 0:
+            idx = np.squeeze(np.where(np.logical_and(vcoord[:, :-1, ...] <= lev,
+                                                     vcoord[:, 1:, ...] > lev)))
+        else:
+            idx = np.squeeze(np.where(np.logical_and(vcoord[:, :-1, ...] > lev,
+                                                     vcoord[:, 1:, ...] <= lev)))
+        idx_abve = idx.copy()
+        idx_belw = idx.copy()
+        out_idx = idx.copy()
+        out_idx[1, :] = lev_idx
+        idx_abve[1, :] += idx_gt
+        idx_belw[1, :] += idx_lt
+        idx_abve = tuple(idx_abve)
+        idx_belw = tuple(idx_belw)
+        out_idx = tuple(out_idx)
+
+        wgt1 = ((lev - vcoord[idx_belw]) / (vcoord[idx_abve] - vcoord[idx_belw]))
+        wgt0 = 1.0 - wgt1
+        if data.ndim >= vcoord.ndim:
+            out_data[out_idx] = (wgt0 * data[idx_belw] + wgt1 * data[idx_abve])
+        else:
+            out_data[out_idx] = (wgt0 * data[idx_belw[1]] + wgt1 * data[idx_abve[1]])
+
+    return np.squeeze(out_data)
+
+
+def legacy_interp_nd(lat, theta_in, data, lat_hr, theta_hr):
+    """Regrid 4-D data with one `interp2d` per (time, lon), as `utils.interp_nd` did."""
+    data_interp = np.zeros((data.shape[0], theta_hr.shape[0], lat_hr.shape[0],
+                            data.shape[-1]))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        for tix in range(data.shape[0]):
+            for lix in range(data.shape[-1]):
+                data_f = interp.interp2d(lat, theta_in, data[tix, :, :, lix],
+                                         kind='cubic')
+                data_interp[tix, :, :, lix] = data_f(lat_hr, theta_hr)
+    return data_interp
+
+
+def legacy_diff_cfd(data, axis=-1):
+    """Non-cyclic centred difference assembled with `np.append`, as `diff_cfd` was."""
+    slc = utils.NDSlicer(axis, data.ndim)
+    diff = data[slc[2:None]] - data[slc[None:-2]]
+    diff = np.append((data[slc[1:2]] - data[slc[0:1]]), diff, axis=axis)
+    return np.append(diff, (data[slc[-1:None]] - data[slc[-2:-1]]), axis=axis)
+
+
+def legacy_xrdiffz(data, vcoord, dim):
+    """Uneven vertical derivative joined with `xr.concat`, as `xrdiffz` was."""
+    d_z = (vcoord.isel(**{dim: slice(1, None)}).drop(dim) -
+           vcoord.isel(**{dim: slice(None, -1)}).drop(dim))
+    d_z1 = d_z.isel(**{dim: slice(1, None)})
+    d_z2 = d_z.isel(**{dim: slice(None, -1)})
+    diff = ((d_z2 * data.isel(**{dim: slice(2, None)}).drop(dim) +
+             (d_z1 - d_z2) * data.isel(**{dim: slice(1, -1)}).drop(dim) -
+             d_z1 * data.isel(**{dim: slice(None, -2)}).drop(dim)) /
+            (2.0 * d_z1 * d_z2))
+    diff = diff.assign_coords(**{dim: data[dim].isel(**{dim: slice(1, -1)})})
+    edges = []
+    for idx, (lo_idx, hi_idx) in zip([0, -1], [(0, 1), (-2, -1)]):
+        _dz = (vcoord.isel(**{dim: hi_idx}).drop(dim) -
+               vcoord.isel(**{dim: lo_idx}).drop(dim))
+        edge = (data.isel(**{dim: hi_idx}).drop(dim) -
+                data.isel(**{dim: lo_idx}).drop(dim)) / _dz
+        edges.append(edge.assign_coords(**{dim: data[dim].isel(**{dim: idx})}))
+    return xr.concat((edges[0], diff, edges[1]), dim=dim).transpose(*data.dims)
+
+
+def legacy_xripv(uwnd, vwnd, tair, dimvars, th_levels):
+    """IPV from theta, interpolation and vorticity as separate arrays, as `xripv` was."""
+    vlev = dimvars['lev']
+    thta = utils.xrtheta(tair, pvar=vlev)
+    u_th, v_th, p_th = utils.xrvinterp_multi([uwnd, vwnd, uwnd[vlev] + 0 * uwnd], thta,
+                                             th_levels, levname=vlev, newlevname=vlev)
+    return utils.xripv_theta(u_th, v_th, p_th, dimvars), p_th, u_th
+
+
+def legacy_find_tropopause_mask(dtdz, d_z, thr=2.0):
+    """Tropopause mask from one `trop_lev_1d` call per column, as it was found."""
+    _trop_lev = kernels.get_kernels('numpy').trop_lev_1d
+    trop_level = np.empty(dtdz.shape, dtype=bool)
+    for ixt in range(dtdz.shape[0]):
+        for ixy in range(dtdz.shape[2]):
+            for ixx in range(dtdz.shape[3]):
+                trop_level[ixt, :, ixy, ixx] = _trop_lev(dtdz[ixt, :, ixy, ixx],
+                                                         d_z[ixt, :, ixy, ixx], thr)
+    return trop_level
+
+
+def legacy_poly_deriv(lat, data, deg):
+    """Fit and differentiate one column at a time, as `STJPV._poly_deriv` does."""
+    out = np.full(data.shape, np.nan)
+    for idx in np.ndindex(data.shape[:-1]):
+        valid = np.isfinite(data[idx])
+        if valid.any():
+            fit = np.polynomial.chebyshev.chebfit(lat[valid], data[idx][valid], deg)
+            out[idx] = np.polynomial.chebyshev.chebval(
+                lat, np.polynomial.chebyshev.chebder(fit)
+            )
+    return out
+
+
+def legacy_lowest_valid(uwnd, levname):
+    """Lowest valid wind with one function call per column, as `_get_max_shear` did."""
+    def _lowest_valid(col):
+        return col[np.isfinite(col).argmax()]
+
+    return xr.apply_ufunc(_lowest_valid, uwnd, input_core_dims=[[levname]],
+                          vectorize=True, dask='parallelized',
+                          output_dtypes=[uwnd.dtype])
+
+
+def sample_fields(shape=(30, 37, 73, 144), seed=0):
+    """
+    Generate wind, pressure and potential temperature fields for benchmarking.
+
+    Parameters
+    ----------
+    shape : tuple
+        Shape of the (time, pressure, lat, lon) fields
+    seed : int
+        Seed for the random number generator
+
+    Returns
+    -------
+    uwnd, theta : array_like
+        Zonal wind [m/s] and potential temperature [K] on pressure levels
+    pres : array_like
+        1-D pressure levels [Pa]
+
+    """
+    rng = np.random.default_rng(seed)
+    pres = np.linspace(100000.0, 5000.0, shape[1])
+    tair = (288.0 - 70.0 * np.linspace(0, 1, shape[1])[None, :, None, None] +
+            rng.normal(0, 1, shape))
+    thta = tair * (100000.0 / pres[None, :, None, None]) ** utils.KPPA
+    uwnd = rng.normal(0, 10, shape)
+    return uwnd, thta, pres
+
+
+def timed(name, func, *args, number=3):
+    """Print the best time of `number` calls of func(*args), return it."""
+    best = min(timeit.repeat(lambda: func(*args), number=1, repeat=number))
+    print('{:40s} {:8.3f} s'.format(name, best))
+    return best
+
+
+def peak_memory(name, func, *args):
+    """Print peak memory allocated during func(*args) in multiples of its output size."""
+    tracemalloc.start()
+    out = func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print('{:40s} {:8.1f} x output'.format(name, peak / out.nbytes))
+
+
+def bench_vinterp(shape):
+    """Compare vertical interpolation to theta levels with the legacy loop."""
+    uwnd, thta, _ = sample_fields(shape)
+    th_levels = np.arange(300.0, 500.0, 5.0)
+    print('VINTERP {} -> {} levels'.format(shape, th_levels.shape[0]))
+    t_new = timed('utils.vinterp', utils.vinterp, uwnd, thta, th_levels)
+    t_old = timed('legacy loop', legacy_vinterp, uwnd, thta, th_levels)
+    assert np.allclose(utils.vinterp(uwnd, thta, th_levels),
+                       legacy_vinterp(uwnd, thta, th_levels), equal_nan=True)
+    print('{:40s} {:8.1f} x'.format('speedup', t_old / t_new))
+
+
+def bench_vinterp_multi(shape):
+    """Compare fused interpolation of u, v, p with one :func:`utils.vinterp` per field."""
+    uwnd, thta, pres = sample_fields(shape)
+    vwnd = uwnd[:, :, ::-1]
+    th_levels = np.arange(300.0, 500.0, 5.0)
+
+    def separate():
+        return [utils.vinterp(field, thta, th_levels) for field in (uwnd, vwnd, pres)]
+
+    print('VINTERP_MULTI {} -> {} levels'.format(shape, th_levels.shape[0]))
+    t_new = timed('utils.vinterp_multi', utils.vinterp_multi, [uwnd, vwnd, pres],
+                  thta, th_levels)
+    t_old = timed('utils.vinterp x 3', separate)
+    print('{:40s} {:8.1f} x'.format('speedup', t_old / t_new))
+
+
+def bench_interp_nd(shape):
+    """Compare batched lat-theta regridding with the legacy loop of `interp2d` calls."""
+    rng = np.random.default_rng(0)
+    lat = np.linspace(90.0, -90.0, shape[2])
+    theta = np.linspace(300.0, 400.0, shape[1])
+    data = rng.normal(0, 10, shape)
+    lat_hr = np.linspace(-90.0, 90.0, 4 * shape[2])
+    theta_hr = np.linspace(300.0, 400.0, 4 * shape[1])
+
+    print('INTERP_ND {} -> ({}, {})'.format(shape, theta_hr.shape[0], lat_hr.shape[0]))
+    t_new = timed('utils.interp_nd', utils.interp_nd, lat, theta, data, lat_hr, theta_hr)
+    t_old = timed('legacy loop', legacy_interp_nd, lat, theta, data, lat_hr, theta_hr,
+                  number=1)
+    assert np.allclose(utils.interp_nd(lat, theta, data, lat_hr, theta_hr),
+                       legacy_interp_nd(lat, theta, data, lat_hr, theta_hr))
+    print('{:40s} {:8.1f} x'.format('speedup', t_old / t_new))
+
+
+def bench_stencils(shape):
+    """Compare single-allocation stencils with differences joined by append / concat."""
+    uwnd, _, pres = sample_fields(shape)
+    uwnd = uwnd.astype(np.float32)
+    dims = ('time', 'pres', 'lat', 'lon')
+    uwnd_xr = xr.DataArray(uwnd, dims=dims, coords={'pres': pres})
+
+    print('STENCILS {}'.format(shape))
+    for axis in [-1, -2]:
+        name = 'diff_cfd axis={}'.format(axis)
+        t_new = timed('stencils.{}'.format(name), stencils.diff_cfd, uwnd, axis)
+        t_old = timed('legacy {}'.format(name), legacy_diff_cfd, uwnd, axis)
+        assert np.all(stencils.diff_cfd(uwnd, axis) == legacy_diff_cfd(uwnd, axis))
+        peak_memory('stencils.{}'.format(name), stencils.diff_cfd, uwnd, axis)
+        peak_memory('legacy {}'.format(name), legacy_diff_cfd, uwnd, axis)
+        print('{:40s} {:8.1f} x'.format('speedup', t_old / t_new))
+
+    t_new = timed('stencils.xrdiffz', stencils.xrdiffz, uwnd_xr, uwnd_xr.pres, 'pres')
+    t_old = timed('legacy xrdiffz', legacy_xrdiffz, uwnd_xr, uwnd_xr.pres, 'pres')
+    assert np.allclose(stencils.xrdiffz(uwnd_xr, uwnd_xr.pres, 'pres'),
+                       legacy_xrdiffz(uwnd_xr, uwnd_xr.pres, 'pres'))
+    peak_memory('stencils.xrdiffz', stencils.xrdiffz, uwnd_xr, uwnd_xr.pres, 'pres')
+    peak_memory('legacy xrdiffz', legacy_xrdiffz, uwnd_xr, uwnd_xr.pres, 'pres')
+    print('{:40s} {:8.1f} x'.format('speedup', t_old / t_new))
+
+
+def bench_xrvinterp(shape):
+    """Report task graph size and run time of :func:`utils.xrvinterp` on dask arrays."""
+    uwnd, thta, pres = sample_fields(shape)
+    th_levels = np.arange(300.0, 500.0, 5.0)
+    dims = ('time', 'pres', 'lat', 'lon')
+    coords = {'pres': pres}
+    chunks = {'time': 1}
+    uwnd = xr.DataArray(uwnd, dims=dims, coords=coords, name='uwnd').chunk(chunks)
+    thta = xr.DataArray(thta, dims=dims, coords=coords, name='thta').chunk(chunks)
+
+    print('XRVINTERP {} -> {} levels, {} chunks'
+          .format(shape, th_levels.shape[0], uwnd.data.npartitions))
+    intp = utils.xrvinterp(uwnd, thta, th_levels, levname='pres', newlevname='lev')
+    print('{:40s} {:8d}'.format('graph tasks', len(dict(intp.data.__dask_graph__()))))
+    timed('utils.xrvinterp (compute)', intp.compute)
+
+
+def bench_xripv(shape):
+    """Compare fused IPV calculation with theta, interpolation and vorticity in turn."""
+    uwnd, thta, pres = sample_fields(shape)
+    th_levels = np.arange(300.0, 400.0, 5.0, dtype=np.float32)
+    dims = ('time', 'lev', 'lat', 'lon')
+    coords = {'lev': pres, 'lat': np.linspace(-90.0, 90.0, shape[2]),
+              'lon': np.linspace(0.0, 360.0, shape[3], endpoint=False)}
+    dimvars = {'lev': 'lev', 'lat': 'lat', 'lon': 'lon'}
+    tair = thta * (pres[None, :, None, None] / 100000.0) ** utils.KPPA
+    fields = [xr.DataArray(field.astype(np.float32), dims=dims, coords=coords)
+              .chunk({'time': 1}) for field in (uwnd, uwnd[:, :, ::-1], tair)]
+
+    print('XRIPV {} -> {} levels, {} chunks'
+          .format(shape, th_levels.shape[0], fields[0].data.npartitions))
+    for name, func in [('utils.xripv', utils.xripv), ('legacy', legacy_xripv)]:
+        ipv = func(*fields, dimvars, th_levels)
+        graph = dict(ipv[0].data.__dask_graph__())
+        print('{:40s} {:8d}'.format('{} graph tasks'.format(name), len(graph)))
+        timed('{} (compute)'.format(name), lambda: dask.compute(*ipv))
+
+        # Reduce the outputs, so the peak is from intermediate arrays in each chunk
+        with dask.config.set(scheduler='synchronous'):
+            tracemalloc.start()
+            dask.compute(*[out.sum() for out in ipv])
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        print('{:40s} {:8.1f} MB'.format('{} peak memory'.format(name), peak / 1e6))
+
+
+def bench_xripv_order(shape):
+    """Check that xripv is the same for levels from the surface up or the top down."""
+    uwnd, thta, pres = sample_fields(shape)
+    th_levels = np.arange(300.0, 400.0, 5.0, dtype=np.float32)
+    dims = ('time', 'lev', 'lat', 'lon')
+    coords = {'lev': pres, 'lat': np.linspace(-90.0, 90.0, shape[2]),
+              'lon': np.linspace(0.0, 360.0, shape[3], endpoint=False)}
+    dimvars = {'lev': 'lev', 'lat': 'lat', 'lon': 'lon'}
+    tair = thta * (pres[None, :, None, None] / 100000.0) ** utils.KPPA
+    fields = [xr.DataArray(field.astype(np.float32), dims=dims, coords=coords)
+              for field in (uwnd, uwnd[:, :, ::-1], tair)]
+    # Columns where theta is not monotonic have more than one crossing of some levels
+    n_multi = (np.diff(thta, axis=1) <= 0).any(axis=1).sum()
+
+    print('XRIPV LEVEL ORDER {}, {} columns with multiple crossings'
+          .format(shape, n_multi))
+    sfc_first = utils.xripv(*fields, dimvars, th_levels)
+    top_first = utils.xripv(*[field.isel(lev=slice(None, None, -1)) for field in fields],
+                            dimvars, th_levels)
+    for name, out_s, out_t in zip(['ipv', 'p_th', 'u_th'], sfc_first, top_first):
+        np.testing.assert_array_equal(out_s.values, out_t.values, err_msg=name)
+    print('{:40s} {:>8s}'.format('surface first == top first', 'True'))
+
+
+def bench_tropopause(shape):
+    """Compare vectorised WMO tropopause mask with the loop over columns."""
+    _, thta, pres = sample_fields(shape)
+    tair = utils.inv_theta(thta, pres[None, :, None, None])
+    dtdz, d_z = utils.lapse_rate(tair, pres)
+
+    print('TROPOPAUSE {}'.format(shape))
+    t_new = timed('utils.find_tropopause_mask', utils.find_tropopause_mask, dtdz, d_z)
+    t_old = timed('legacy loop', legacy_find_tropopause_mask, dtdz, d_z, number=1)
+    assert np.all(utils.find_tropopause_mask(dtdz, d_z) ==
+                  legacy_find_tropopause_mask(dtdz, d_z))
+    print('{:40s} {:8.1f} x'.format('speedup', t_old / t_new))
+    timed('utils.get_tropopause_pres', utils.get_tropopause_pres, tair, pres / 100.0)
+
+
+def bench_spline_tropopause(shape):
+    """Report run time of spline refined tropopause, compare with one on input levels."""
+    rng = np.random.default_rng(0)
+    pres = np.geomspace(1000.0, 10.0, shape[1])
+    height = -7.0 * np.log(pres / 1000.0)
+    trop_height = rng.uniform(9.0, 16.0, shape[:1] + shape[2:])[..., None]
+    tair = (288.0 - 6.5 * np.minimum(height, trop_height) +
+            np.maximum(height - trop_height - 5.0, 0.0) +
+            rng.normal(0, 0.2, shape[:1] + shape[2:] + shape[1:2]))
+
+    print('SPLINE TROPOPAUSE {} -> {} levels'.format(shape, thermal_tropopause.N_FINE))
+    timed('thermal_tropopause.find_tropopause', thermal_tropopause.find_tropopause,
+          tair, pres)
+    _, trop_spline = thermal_tropopause.find_tropopause(tair, pres)
+    _, trop_levels = utils.get_tropopause_pres(np.moveaxis(tair, -1, 1), pres)
+    trop_true = 1000.0 * np.exp(-trop_height[..., 0] / 7.0)
+    for name, trop in [('spline', trop_spline), ('input levels', trop_levels)]:
+        print('{:40s} {:8.1f} hPa'.format('{} mean abs error'.format(name),
+                                          np.nanmean(np.abs(trop - trop_true))))
+
+
+def bench_poly_deriv(shape):
+    """Compare batched polynomial fit derivative with the loop over columns."""
+    rng = np.random.default_rng(0)
+    lat = np.linspace(10.0, 65.0, 23)
+    # Theta on a PV surface for each (time, lon), missing at some low latitudes
+    thta = (330.0 + 30.0 * np.tanh((lat - 30.0) / 5.0) +
+            rng.normal(0, 1, (shape[0], shape[3], lat.shape[0])))
+    thta[..., :6][rng.uniform(size=thta[..., :6].shape) < 0.3] = np.nan
+
+    cheb = np.polynomial.chebyshev
+    print('POLY DERIV {}'.format(thta.shape))
+
+    def _uncached(*args):
+        utils._cached_deriv_operator.cache_clear()
+        return utils.poly_deriv(*args)
+
+    timed('utils.poly_deriv, empty cache', _uncached, lat, thta, 6, cheb.chebvander,
+          cheb.chebder)
+    t_new = timed('utils.poly_deriv', utils.poly_deriv, lat, thta, 6, cheb.chebvander,
+                  cheb.chebder)
+    t_old = timed('legacy loop', legacy_poly_deriv, lat, thta, 6, number=1)
+    assert np.allclose(utils.poly_deriv(lat, thta, 6, cheb.chebvander, cheb.chebder),
+                       legacy_poly_deriv(lat, thta, 6), rtol=1e-6, atol=1e-8)
+    print('{:40s} {:8.1f} x'.format('speedup', t_old / t_new))
+
+
+def bench_lowest_valid(shape):
+    """Compare vectorised lowest valid level with one function call per column."""
+    uwnd, thta, _ = sample_fields(shape)
+    th_levels = np.arange(300.0, 400.0, 5.0)
+    # Wind on isentropic levels, missing where they are below the surface
+    uwnd = xr.DataArray(utils.vinterp(uwnd, thta, th_levels).astype(np.float32),
+                        dims=('time', 'lev', 'lat', 'lon')).chunk({'time': 1})
+
+    print('LOWEST VALID {}'.format(uwnd.shape))
+    t_new = timed('utils.xrlowest_valid (compute)',
+                  lambda: utils.xrlowest_valid(uwnd, 'lev').compute())
+    t_old = timed('legacy call per column (compute)',
+                  lambda: legacy_lowest_valid(uwnd, 'lev').compute(), number=1)
+    assert np.array_equal(utils.xrlowest_valid(uwnd, 'lev'),
+                          legacy_lowest_valid(uwnd, 'lev'), equal_nan=True)
+    print('{:40s} {:8.1f} x'.format('speedup', t_old / t_new))
+
+
+BENCHMARKS = {'vinterp': bench_vinterp, 'vinterp_multi': bench_vinterp_multi,
+              'xrvinterp': bench_xrvinterp, 'interp_nd': bench_interp_nd,
+              'stencils': bench_stencils, 'xripv': bench_xripv,
+              'xripv_order': bench_xripv_order,
+              'tropopause': bench_tropopause,
+              'spline_tropopause': bench_spline_tropopause,
+              'poly_deriv': bench_poly_deriv, 'lowest_valid': bench_lowest_valid}
+
+
+def main():
+    """Run selected benchmarks."""
+    parser = arg.ArgumentParser(description='Benchmark STJ_PV utilities')
+    parser.add_argument('bench', nargs='*', default=list(BENCHMARKS),
+                        help='Benchmarks to run: {}'.format(', '.join(BENCHMARKS)))
+    parser.add_argument('--shape', type=int, nargs=4, default=[30, 37, 73, 144],
+                        help='Shape of (time, level, lat, lon) test data')
+    args = parser.parse_args()
+
+    for bench in args.bench:
+        BENCHMARKS[bench](tuple(args.shape))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Compare jet positions found with float32 and float64 `precision` run settings."""
+import argparse as arg
+import datetime as dt
+import warnings
+import numpy as np
+from STJ_PV import run_stj
+
+__author__ = "Penelope Maher, Michael Kelleher"
+
+
+def find_jet(cfg_file, precision, date_s, date_e):
+    """Find the jet with `precision` set in the run configuration, return its output."""
+    jf_run = run_stj.JetFindRun(cfg_file)
+    jf_run.config['precision'] = precision
+    return jf_run.run(date_s, date_e, save=False).out_data
+
+
+def main():
+    """Run the jet finder in both precisions, print the differences."""
+    parser = arg.ArgumentParser(description='Compare float32 / float64 jet positions')
+    parser.add_argument('--file', default='{}/stj_config_sample.yml'
+                        .format(run_stj.CFG_DIR), help='Run configuration file')
+    parser.add_argument('--ds', default='2016-01-01', help='Start date (YYYY-MM-DD)')
+    parser.add_argument('--de', default='2016-01-03', help='End date (YYYY-MM-DD)')
+    parser.add_argument('--tol', type=float, default=0.5,
+                        help='Maximum allowed jet latitude difference (degrees)')
+    args = parser.parse_args()
+
+    np.seterr(all='ignore')
+    warnings.simplefilter('ignore', RuntimeWarning)
+    date_s = dt.datetime.strptime(args.ds, '%Y-%m-%d')
+    date_e = dt.datetime.strptime(args.de, '%Y-%m-%d')
+
+    jet = {prec: find_jet(args.file, prec, date_s, date_e)
+           for prec in ['float32', 'float64']}
+
+    print('{:15s} {:>12s} {:>12s}'.format('variable', 'max diff', 'mean diff'))
+    for var in sorted(jet['float64']):
+        diff = np.abs(jet['float32'][var].values - jet['float64'][var].values)
+        print('{:15s} {:12.4f} {:12.4f}'.format(var, np.nanmax(diff), np.nanmean(diff)))
+
+    lat_diff = max(np.nanmax(np.abs(jet['float32'][var].values -
+                                    jet['float64'][var].values))
+                   for var in jet['float64'] if var.startswith('lat'))
+    if lat_diff > args.tol:
+        print('JET LATITUDE DIFFERENCE {:.4f} EXCEEDS {:.4f}'.format(lat_diff, args.tol))
+    else:
+        print('JET LATITUDES AGREE WITHIN {:.4f}'.format(args.tol))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,143 +1,220 @@
-import numpy as np
-import pdb
-import matplotlib.pyplot as plt
-from general_plotting import log_axis
-from common_modules import list_common_elements
-
-__author__ = "Penelope Maher"
-
-
-def TropopauseHeightLevel(T_spline, P_spline, tck):
-    """
-    WMO definition of tropopause is the 2K/km threshold.
-    Assumes data is spline fit with monotonically incresing pressure.
-    Assumes data is in hPa.
-    """
-    
-    dTdz = np.zeros(len(P_spline - 1))
-    rho = np.zeros(len(P_spline - 1))
-    rate_change = np.zeros(len(P_spline - 1))
-    dz = np.zeros(len(P_spline - 1))
-
-    R_d = 287.0  # JK^-1kg^-1  gas constant of dry air
-    g = 9.81  # m/s^2
-
-    H_threshold = 2.0  # K/km this is the WHO threshold
-
-    for lev in xrange(len(P_spline) - 1):
-        # diff from surface up
-        dT = T_spline[lev + 1] - T_spline[lev]          # units = K
-        dp = (P_spline[lev + 1] - P_spline[lev]) * 100  # units = Pa
-
-        # density
-        rho[lev] = (P_spline[lev] * 100) / (R_d * T_spline[lev])  # rho = p/(r_d*T)
-        # hydrostatic approximation units = km
-        dz[lev] = - dp / (rho[lev] * g) / 1000
-        # lapse rate dt/dz
-        # units = K/km
-        dTdz[lev] = (-dT / dz[lev])  # gamma > 0
-
-
-    # test if the lapse rate exceeds 2.0 in a 2KM layer above
-    TropHeightIndex = IterateCheckTropoHeight(dTdz=dTdz, dz=dz, T_spline=T_spline,
-                                              P_spline=P_spline,
-                                              H_threshold=H_threshold)
-
-    # assign the p and t at tropopause
-    pressure_tropopause = P_spline[TropHeightIndex]
-    temperature_tropopause = T_spline[TropHeightIndex]
+# -*- coding: utf-8 -*-
+"""
+Spline-refined WMO lapse rate tropopause.
 
-    test_plot = False
-    if test_plot:
-        TestTropoHeightPlot(T_spline, P_spline, dTdz, pressure_tropopause)
+Temperature is fit with a cubic spline in the vertical, for all columns at once, then
+evaluated on a fine pressure grid where the WMO definition of the tropopause is
+applied: the lowest level (above `P_MAX`) at which the lapse rate is less than 2 K/km,
+and stays less than 2 K/km for the 2 km above.
 
+"""
+import numpy as np
+import xarray as xr
+from scipy import interpolate as interp
+from STJ_PV import utils
 
-    return TropHeightIndex, pressure_tropopause, temperature_tropopause, dTdz
-
+__author__ = "Penelope Maher, Michael Kelleher"
 
+# Lowest pressure level where the tropopause may be found [hPa]
+P_MAX = 500.0
 
-def IterateCheckTropoHeight(dTdz, dz, T_spline, P_spline, H_threshold):
-    'In the 2km layer above does the lapse rate exceed 2K/km?'
+# Number of levels, evenly spaced in log-pressure, between `P_MAX` and the top of the
+# input data that the spline is evaluated on
+N_FINE = 200
 
-    rate_lt_2km = np.where(dTdz <= H_threshold)[0]  #where is the lapse rate less than 2
-    upper_tropo = np.where(P_spline <=500.) [0]
-    common_list = list_common_elements(rate_lt_2km.tolist(),upper_tropo.tolist())
-    common_list.sort() #ensure list is ordered
-    tropopause_level = None
 
-    for j in common_list[::-1]:
-        if tropopause_level is None:
-            guess_trop_height = j
-            #assume lowest level of 2km threshold is tropopause height then test for it
-            tropopause_level = LoopTestTropoLevel(dTdz=dTdz, dz=dz, list_elem=common_list,
-                                                  guess_trop_height=guess_trop_height,
-                                                  P_spline=P_spline)
- 
-    if tropopause_level is None:
-        print 'Tropopause height not found'
-        pdb.set_trace()
+def spline_profiles(t_air, pres, pres_fine):
+    """
+    Fit cubic splines to temperature profiles, evaluate them on a finer grid.
+
+    Parameters
+    ----------
+    t_air : array_like
+        N-D array of air temperature, vertical axis last
+    pres : array_like
+        1-D array of pressure levels, matching last axis of `t_air`
+    pres_fine : array_like
+        1-D array of pressure levels on which to evaluate the splines
+
+    Returns
+    -------
+    t_fine : array_like
+        N-D array of temperature on `pres_fine`, vertical axis last
 
+    """
+    order = np.argsort(pres)
+    spline = interp.CubicSpline(pres[order], t_air[..., order], axis=-1)
+    return spline(pres_fine).astype(t_air.dtype)
 
-    return tropopause_level
 
-def LoopTestTropoLevel(dTdz, dz, list_elem,guess_trop_height, P_spline):
-    'In the 2km layer above does the lapse rate exceed 2K/km?'
-    # loop over the data above the estimated tropopause height
-    # don't include last elem as its zero
+def _layer_top(height, depth):
+    """
+    Index of the level `depth` above each level of monotonic height profiles.
 
-    store_dz = 0.0
-    tropopause_level = None
+    Parameters
+    ----------
+    height : array_like
+        2-D array of (column, level), increasing along levels
+    depth : float
+        Depth of layer, same units as `height`
 
-    #assume the lowest layer above 500 hPa and a lapse rate less than 2 is H. 
-    #then test to make sure there is not a layer above in which it is large
+    Returns
+    -------
+    top : array_like
+        2-D array of the index of the first level at least `depth` above each level,
+        or the number of levels if the profile ends first
 
-    elem = np.where(np.array(list_elem) == guess_trop_height)[0]
+    """
+    ncol, nlev = height.shape
 
-    if len(elem) != 1:
-        pdb.set_tace()
+    # Offset columns from each other so all are one increasing array, then find where
+    # each target height goes in it, this is numpy.searchsorted for each column
+    span = height[:, -1] - height[:, 0] + depth + 1.0
+    offset = np.concatenate(([0.0], np.cumsum(span[:-1])))[:, None] - height[:, :1]
+    top = np.searchsorted((height + offset).ravel(), (height + depth + offset).ravel())
+    return np.minimum(top.reshape(ncol, nlev) - np.arange(ncol)[:, None] * nlev, nlev)
 
-    for i in list_elem[0:elem[0]+1][::-1]: #from middle atmos up, only between guess and above
 
-        if tropopause_level is None:    
-            store_dz = store_dz + dz[i]
-            if np.abs(store_dz) >= 2.0:  # 2 km layer above tropopause estimate reached
-                #between guess and i, does gamma exceed 2?
-                gamma_2km_above = dTdz[i:(guess_trop_height+1)]
-                if len(gamma_2km_above) >= 1:
-                    if gamma_2km_above.max() < 2.0:
-                        tropopause_level = guess_trop_height
-                    else:
-                        # Lapse rate exceeds 2.0K/km in the 2km layer above tropopause
-                        tropopause_level = None
-                else:
-                    #for testing only
-                    pdb.set_trace()
+def wmo_tropopause(t_air, pres, thr=2.0, depth=2.0):
+    """
+    Find the WMO tropopause in temperature profiles on evenly resolved levels.
+
+    Parameters
+    ----------
+    t_air : array_like
+        2-D array of (column, level) air temperature [K], levels ordered from the surface
+    pres : array_like
+        1-D array of pressure levels [hPa]
+    thr : float
+        Lapse rate threshold, default/WMO definition is 2.0 K km^-1
+    depth : float
+        Depth of the layer above the tropopause [km] where the lapse rate must stay below
+        `thr`, WMO definition is 2 km
+
+    Returns
+    -------
+    trop_idx : array_like
+        1-D array of the tropopause level in each column
+    found : array_like
+        1-D array of booleans, False where no level meets the WMO criteria
 
-            if np.abs(store_dz) < 2.0:
-                # if the layers above never add up to 2 km
-                # print 'There is not a 2km layer above the tropopause.'
-                tropopause_level = None
+    """
+    # Hydrostatic layer depth and lapse rate [K/km] of each layer, from level k to k + 1
+    rho = (pres[:-1] * 100.0) / (utils.R_D * t_air[:, :-1])
+    d_z = -(np.diff(pres) * 100.0) / (rho * utils.GRV) / 1000.0
+    dtdz = -np.diff(t_air, axis=-1) / d_z
+    nlay = dtdz.shape[-1]
+
+    # Top of the layer `depth` above each level (the layers from level k to top - 1),
+    # and first layer at or above each level where lapse rate is not below threshold
+    # (NaN is not below threshold)
+    height = np.concatenate((np.zeros((d_z.shape[0], 1)),
+                             np.cumsum(d_z, axis=-1, dtype=np.float64)), axis=-1)
+    # Columns with missing data are flat, so no layer is deep enough
+    height[~np.isfinite(height).all(axis=-1)] = 0.0
+    top = _layer_top(height, depth)[:, :-1]
+    layer_idx = np.where(dtdz < thr, nlay, np.arange(nlay))
+    next_warm = np.minimum.accumulate(layer_idx[:, ::-1], axis=-1)[:, ::-1]
+
+    # Levels where the layer above is deep enough, and below threshold through it
+    trop_level = (top <= nlay) & (next_warm >= top)
+    return trop_level.argmax(axis=-1), trop_level.any(axis=-1)
+
+
+def find_tropopause(t_air, pres, thr=2.0, n_fine=N_FINE, p_max=P_MAX):
+    """
+    Return the tropopause temperature and pressure, using spline refined profiles.
+
+    Parameters
+    ----------
+    t_air : array_like
+        N-D array of air temperature [K], vertical axis last
+    pres : array_like
+        1-D array of pressure levels [hPa], matching last axis of `t_air`
+    thr : float
+        Lapse rate threshold, default/WMO definition is 2.0 K km^-1
+    n_fine : int
+        Number of levels between `p_max` and the top of `pres` to evaluate splines on
+    p_max : float
+        Lowest pressure level where the tropopause may be found [hPa]
+
+    Returns
+    -------
+    trop_temp, trop_pres : array_like
+        Temperature and pressure at tropopause level, in (N-1)-D arrays, NaN where
+        the tropopause is not found
 
-    return tropopause_level
+    """
+    pres = np.asarray(pres)
+    out_shape = t_air.shape[:-1]
+    t_air = t_air.reshape(-1, pres.shape[0])
 
+    # Splines can't be fit to missing data, these columns are given a placeholder
+    # profile here, and a missing tropopause at the end
+    missing = ~np.isfinite(t_air).all(axis=-1)
+    t_air = np.where(missing[:, None], 1.0, t_air)
 
+    pres_fine = np.geomspace(p_max, pres.min(), n_fine)
+    t_fine = spline_profiles(t_air, pres, pres_fine)
+    trop_idx, found = wmo_tropopause(t_fine, pres_fine, thr=thr)
+    found &= ~missing
 
+    trop_temp = np.where(found, t_fine[np.arange(t_fine.shape[0]), trop_idx], np.nan)
+    trop_pres = np.where(found, pres_fine[trop_idx], np.nan)
+    return (trop_temp.reshape(out_shape).astype(t_air.dtype),
+            trop_pres.reshape(out_shape).astype(t_air.dtype))
 
-def TestTropoHeightPlot(T_spline, P_spline, dTdz, pressure_tropopause):
-    'The intersection of the two -- marks the tropopause height'
 
-    fig = plt.figure(figsize=(8, 8))
-    ax = fig.add_axes([0.1, 0.15, 0.8, 0.8])
+def xr_find_tropopause(tair, dimvars=None, thr=2.0, n_fine=N_FINE, p_max=P_MAX,
+                       pfac=None):
+    """
+    Return the spline refined tropopause from :class:`xarray.DataArray`.
+
+    Parameters
+    ----------
+    tair : :class:`xarray.DataArray`
+        N-D array of temperature on pressure levels, in K
+    dimvars : dict
+        Mapping of variable names for standard coordinates. This will default
+        to 'lev' -> 'level'
+    thr : float
+        Lapse rate threshold, default/WMO definition is 2.0 K km^-1
+    n_fine : int
+        Number of levels between `p_max` and the top of `pres` to evaluate splines on
+    p_max : float
+        Lowest pressure level where the tropopause may be found [hPa]
+    pfac : float, optional
+        Multiply the vertical coordinate of `tair` by this to get pressure in Pa
+        (`pfac` in the data configuration). Default is None, which guesses from the
+        coordinate's `units` attribute, and uses Pa if there isn't one
+
+    Returns
+    -------
+    trop_temp, trop_pres : :class:`xarray.DataArray`
+        Temperature [K] and pressure [Pa] at tropopause level, where dimension dropped
+        is vertical dimension, NaN where no tropopause is found
+
+    Notes
+    -----
+    Each chunk of `tair` is computed separately, so `tair` may be chunked in any
+    dimension except the vertical.
 
-    ax.plot(T_spline - 273.15, P_spline, c='black', linestyle='-',
-            marker='.', label='')  # check spline fit data
-    ax.plot(dTdz, P_spline, c='red', linestyle='-',
-            marker='.', label='')  # check lapse rate
-    ax.plot([-100, 100], [pressure_tropopause, pressure_tropopause],
-            c='grey', linestyle='--')
-    ax.plot([2, 2], [1000, 1], c='grey', linestyle='--')
-    update_axis = log_axis(ax, P_spline, labelFontSize="small")
-    ax.set_xlim(-80, 30)
-    ax.set_ylim([1000, 10])
-    plt.show()
-    pdb.set_trace()
+    """
+    if dimvars is None:
+        dimvars = {'lev': 'level'}
+    vlev = dimvars['lev']
+    if pfac is None:
+        pfac = utils._pres_scale(tair[vlev])
+    pres = tair[vlev].values * pfac / 100.0
+
+    trop_temp, trop_pres = xr.apply_ufunc(
+        find_tropopause,
+        tair,
+        input_core_dims=[[vlev]],
+        output_core_dims=[[], []],
+        dask='parallelized',
+        output_dtypes=[tair.dtype, tair.dtype],
+        kwargs={'pres': pres, 'thr': thr, 'n_fine': n_fine, 'p_max': p_max},
+    )
+
+    return trop_temp, trop_pres * 100.0
@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 """Utility functions not specific to subtropical jet finding."""
 from __future__ import division
+import functools
 import numpy as np
 import xarray as xr
-import xarray.ufuncs as xu
+import dask.array as da
 from scipy import interpolate as interp
+from STJ_PV import kernels
+from STJ_PV import stencils
 
 __author__ = "Penelope Maher, Michael Kelleher"
 
@@ -18,6 +21,12 @@ EARTH_R = 6.371e6       # Radius of earth                   [m]
 R_D = 287.0             # Dry gas constant                  [J kg^-1 K^-1]
 C_P = 1004.0            # Specific heat of dry air          [J kg^-1 K^-1]
 KPPA = R_D / C_P        # Ratio of gas constants
+GEOMETRY_CACHE_SIZE = 8  # Number of grids for which GridGeometry is kept in memory
+POLY_CACHE_SIZE = 256  # Number of polynomial fit derivative operators kept in memory
+
+# Column kernels for functions in this module, the backend is found once, on import,
+# from the STJPV_KERNELS environment variable
+_KERNELS = kernels.get_kernels()
 
 
 class NDSlicer(object):
@@ -101,10 +110,10 @@ class NDSlicer(object):
             list of slices such that all data at other axes are kept, one axis is sliced
 
         """
-        self.__getitem__(slice(start, stop, step))
+        return self.__getitem__(slice(start, stop, step))
 
 
-def vinterp(data, vcoord, vlevels):
+def vinterp(data, vcoord, vlevels, decreasing=None):
     r"""
     Perform linear vertical interpolation.
 
@@ -117,6 +126,9 @@ def vinterp(data, vcoord, vlevels):
         `data`
     vlevels : array_like (1D)
         Levels, in same units as vcoord, to interpolate to
+    decreasing : bool, optional
+        Flag for `vcoord` decreasing with index. Default is None, which determines the
+        direction of each column of `vcoord` separately
 
     Returns
     -------
@@ -177,203 +189,335 @@ def vinterp(data, vcoord, vlevels):
     This gives potential vorticity on new pressure surfaces.
 
     """
-    if vcoord.ndim == 1 and data.ndim > 1:
-        # This handles the case where vcoord is 1D and data is N-D
-        v_dim = int(np.where(np.array(data.shape) == vcoord.shape[0])[0])
-        # numpy.broadcast_to only works for the last axis of an array, swap our shape
-        # around so that vertical dimension is last, broadcast vcoord to it, then swap
-        # the axes back so vcoord.shape == data.shape
-        data_shape = list(data.shape)
-        data_shape[-1], data_shape[v_dim] = data_shape[v_dim], data_shape[-1]
+    return vinterp_multi([data], vcoord, vlevels, decreasing)[0]
+
+
+def vinterp_multi(fields, vcoord, vlevels, decreasing=None):
+    """
+    Perform linear vertical interpolation of several fields sharing a vertical coordinate.
+
+    The bracketing levels and interpolation weights are found once, and used for
+    every field, rather than once for each field with :func:`vinterp`.
+
+    Parameters
+    ----------
+    fields : list or dict
+        Arrays of data to be interpolated, each as `data` in :func:`vinterp`
+    vcoord : array_like
+        Array representing the vertical structure (height/pressure/PV/theta/etc.) of
+        all `fields`
+    vlevels : array_like (1D)
+        Levels, in same units as vcoord, to interpolate to
+    decreasing : bool, optional
+        Flag for `vcoord` decreasing with index. Default is None, which determines the
+        direction of each column of `vcoord` separately
+
+    Returns
+    -------
+    out_data : list or dict
+        Each of `fields` on vlevels, of the same type as `fields`
 
-        vcoord = np.broadcast_to(vcoord, data_shape)
-        vcoord = np.swapaxes(vcoord, -1, v_dim)
+    Examples
+    --------
+    Wind components and pressure on theta levels, from data on pressure levels
 
-    vcoord_shape = list(vcoord.shape)
-    vcoord_shape.pop(1)
-    valid = np.min([np.prod(vcoord_shape) - np.sum(np.isnan(vcoord[:, 0, ...])),
-                    np.prod(vcoord_shape) - np.sum(np.isnan(vcoord[:, -1, ...]))])
+        >>> u_th, v_th, p_th = vinterp_multi([uwnd, vwnd, pres], theta, th_levs)
 
-    if np.sum(vcoord[:, 0, ...] > vcoord[:, -1, ...]) / valid > 0.80:
-        # Vcoord data is decreasing on interpolation axis, (at least 80% is)
-        idx_gt = 1
-        idx_lt = 0
+    """
+    if isinstance(fields, dict):
+        names = list(fields.keys())
+        fields = [fields[name] for name in names]
     else:
-        # Data is increasing on interpolation axis
-        idx_gt = 0
-        idx_lt = 1
-
-    if data.ndim >= vcoord.ndim:
-        # Handle case where data has the same dimensions or data has more dimensions
-        # compared to vcoord (e.g. vcoord is 4D, data is 4D, or vcoord is 1D, data is 4D)
-        out_shape = list(data.shape)
+        names = None
+
+    vlevels = np.atleast_1d(vlevels)
+    if vcoord.ndim == 1:
+        # This handles the case where vcoord is 1D and data is N-D (or 1D), the vertical
+        # coordinate is searched once, and only the data need the level axis moved
+        data = next((field for field in fields if field.ndim > 1), fields[0])
+        v_dim = int(np.where(np.array(data.shape) == vcoord.shape[0])[0][0])
+        vcoord_z = vcoord
     else:
-        # Handle case where data has fewer dimensions than vcoord
-        # (e.g. data is 1-D vcoord is N-D)
-        out_shape = list(vcoord.shape)
-    out_shape[1] = vlevels.shape[0]
-
-    out_data = np.zeros(out_shape) + np.nan
-
-    for lev_idx, lev in enumerate(vlevels):
-        if idx_gt == 0:
-            # Case where vcoord data is increasing, find index where vcoord below [:-1]
-            # is equal or less than desired lev, and vcoord above [1:] is greater than
-            # lev, this means <data> for lev is between these points, use
-            # weight to determine exactly where
-            idx = np.squeeze(np.where(np.logical_and(vcoord[:, :-1, ...] <= lev,
-                                                     vcoord[:, 1:, ...] > lev)))
-        else:
-            # This does the same, but where vcoord is decreasing with index, so find
-            # where vcoord below [:-1] is greater, and vcoord above [1:] is less or equal
-            idx = np.squeeze(np.where(np.logical_and(vcoord[:, :-1, ...] > lev,
-                                                     vcoord[:, 1:, ...] <= lev)))
-
-        # Create copies of this index, so they can be modified for weighting functions
-        # and output array
-        idx_abve = idx.copy()
-        idx_belw = idx.copy()
-        out_idx = idx.copy()
-
-        # The interpolation axis index (1) for output is the level index (lev_idx)
-        out_idx[1, :] = lev_idx
-
-        # Weighting function 'above' is index +1 for decreasing, or index +0 for decr.
-        idx_abve[1, :] += idx_gt
-        # Weighting function 'below' is index +0 for decreasing, or index +1 for decr.
-        idx_belw[1, :] += idx_lt
-
-        # Change indicies back into tuples so numpy.array.__getitem__ understands them
-        idx_abve = tuple(idx_abve)
-        idx_belw = tuple(idx_belw)
-        out_idx = tuple(out_idx)
-
-        # Weighting function for distance above lev
-        wgt1 = ((lev - vcoord[idx_belw]) / (vcoord[idx_abve] - vcoord[idx_belw]))
-
-        # Weighting function for distance below lev
-        wgt0 = 1.0 - wgt1
-
-        if data.ndim >= vcoord.ndim:
-            # Handle case where data has same or more dimensions than vcoord
-            out_data[out_idx] = (wgt0 * data[idx_belw] + wgt1 * data[idx_abve])
+        v_dim = 1
+        vcoord_z = np.moveaxis(vcoord, 1, -1)
+
+    if decreasing is None:
+        decreasing = _column_decreasing(vcoord_z)
+
+    # Find the bracketing levels and weights for all target levels at once
+    idx, wgt = _bracket_search(vcoord_z, vlevels, decreasing)
+
+    out_data = []
+    for data in fields:
+        if data.ndim > 1:
+            data_z = np.moveaxis(data, v_dim, -1)
         else:
-            # Handle case where data has fewer dimensions than vcoord
-            out_data[out_idx] = (wgt0 * data[idx_belw[1]] + wgt1 * data[idx_abve[1]])
+            data_z = data
+        out_data.append(np.squeeze(np.moveaxis(_apply_brackets(data_z, idx, wgt),
+                                               -1, v_dim)))
 
-    return np.squeeze(out_data)
+    if names is not None:
+        out_data = dict(zip(names, out_data))
 
+    return out_data
 
-def inc_with_z(vcoord, levname):
+
+def _column_decreasing(vcoord):
     """
-    Find what proportion of `vcoord` is increasing along the `levname` axis.
+    Determine if each column of `vcoord` is decreasing along its last axis.
 
     Parameters
     ----------
-    vcoord : :class:`xarray.DataArray`
-        array of vertical coordinate to test
-    levname : str
-        String name of vertical coordinate variable along which to test
+    vcoord : array_like
+        N-D array of the vertical coordinate, where the last axis is vertical
 
     Returns
     -------
-    pctinc : float
-        Percentage of valid points in vcoord which are increasing
-        with increasing index
+    decreasing : array_like
+        True where the last valid value of a column is less than the first valid value,
+        shape is ``vcoord.shape[:-1]``
 
     """
-    _sabove = {levname: slice(1, None)}
-    _sbelow = {levname: slice(None, -1)}
+    valid = np.isfinite(vcoord)
+    first = valid.argmax(axis=-1)[..., None]
+    last = vcoord.shape[-1] - 1 - valid[..., ::-1].argmax(axis=-1)[..., None]
+    return (np.take_along_axis(vcoord, first, axis=-1) >
+            np.take_along_axis(vcoord, last, axis=-1))[..., 0]
 
-    # number of valid points on the 0th surface
-    nvalid = vcoord.isel(**{levname: 0}).notnull().sum().drop(levname)
 
-    # Places where the vcoord value on the 0th surface is less than the -1th (top)
-    n_incr = (vcoord.isel(**{levname: 0}) < vcoord.isel(**{levname: -1}))
+def _bracket_search(vcoord, vlevels, decreasing=False):
+    """
+    Find the vertical levels bracketing each of `vlevels` in every column of `vcoord`.
 
-    # Sum the number where v[0] < v[-1], divide by number of valid points
-    pctinc = n_incr.sum(skipna=True) / nvalid
+    The levels of every column are placed among the (sorted) target levels with a
+    single sorted search, so the cost is one pass over `vcoord` and one pass over the
+    output for all target levels, rather than one pass over `vcoord` for each.
 
-    return pctinc
+    Parameters
+    ----------
+    vcoord : array_like
+        N-D array of the vertical coordinate, where the last axis is vertical
+    vlevels : array_like
+        1-D array of levels, in the same units as `vcoord`, to find
+    decreasing : bool or array_like
+        Flag for `vcoord` decreasing along its last axis, either a single value, or an
+        array of flags with the shape of `vcoord.shape[:-1]`
 
+    Returns
+    -------
+    idx : array_like
+        Index of the lower of the two bracketing levels, shape is
+        ``(*vcoord.shape[:-1], vlevels.shape[0])``
+    wgt : array_like
+        Linear interpolation weight for the level at ``idx + 1``, same shape as `idx`,
+        NaN where a level is not bracketed by valid data
+
+    Notes
+    -----
+    Where a column is not monotonic, and a level is bracketed more than once, the
+    bracket with the highest index is used. The search is performed on the envelope
+    ``min(vcoord[k:])`` (or ``max(vcoord[k:])`` if decreasing), which is monotonic in
+    every column, to find the last level on the "below" side of the target. This is
+    the bracket unless the top of the column is also "below" the target, for those
+    few points the brackets are found directly.
 
-def _xrvinterp_single(data, vcoord, lev, levname='lev'):
     """
-    Perform linear interpolation along vertical axis on an :class:`xarray.DataArray`.
+    # Target levels take the precision of vcoord, so float32 input stays float32
+    vlevels = np.asarray(vlevels).astype(np.result_type(vcoord.dtype, np.float32),
+                                         copy=False)
+    nlev = vcoord.shape[-1]
+    nlevs = vlevels.shape[0]
+    col_shape = vcoord.shape[:-1]
+    ncol = int(np.prod(col_shape))
+    decr = np.broadcast_to(decreasing, col_shape).reshape(ncol, 1)
+    vcoord = vcoord.reshape(ncol, nlev)
+
+    # Envelope of vcoord from the top down, missing data are ignored. If decreasing,
+    # the sign is changed so "below" the target level is always envelope <= level
+    if decr.all():
+        vc_inc = -vcoord
+    elif not decr.any():
+        vc_inc = vcoord
+    else:
+        vc_inc = np.where(decr, -vcoord, vcoord)
+    envelope = np.fmin.accumulate(vc_inc[:, ::-1], axis=-1)[:, ::-1]
+
+    # Position of each envelope level among the sorted targets. When decreasing,
+    # vcoord == level is "above", so ties are on the other side of the target
+    order_inc = np.argsort(vlevels, kind='stable')
+    order_dec = np.argsort(-vlevels, kind='stable')
+    if decr.all():
+        lev_pos = np.searchsorted(-vlevels[order_dec], envelope, side='right')
+    elif not decr.any():
+        lev_pos = np.searchsorted(vlevels[order_inc], envelope, side='left')
+    else:
+        lev_pos = np.where(decr,
+                           np.searchsorted(-vlevels[order_dec], envelope, side='right'),
+                           np.searchsorted(vlevels[order_inc], envelope, side='left'))
+
+    # The number of envelope levels below each (sorted) target is the index of the
+    # last envelope level below it, plus one. Count with a histogram of positions
+    lev_pos += np.arange(ncol)[:, np.newaxis] * (nlevs + 1)
+    n_below = np.bincount(lev_pos.ravel(), minlength=ncol * (nlevs + 1))
+    n_below = np.cumsum(n_below.reshape(ncol, nlevs + 1)[:, :-1], axis=-1)
+
+    # Put targets back in their original order
+    lo_idx = np.empty((ncol, nlevs), dtype=int)
+    if decr.any():
+        lo_idx[:, order_dec] = n_below - 1
+    if not decr.all():
+        lo_idx[:, order_inc] = np.where(decr, lo_idx[:, order_inc], n_below - 1)
+
+    # The level at lo_idx + 1 is above the target, unless the top of the column is
+    # below the target while another level is above it (e.g. a surface inversion when
+    # vcoord is ordered top down), or it is missing. Find those few brackets directly
+    levs = np.broadcast_to(vlevels, (ncol, nlevs))
+    any_above = (np.fmax.reduce(vc_inc, axis=-1, keepdims=True) >=
+                 np.where(decr, -levs, levs))
+    redo = (lo_idx == nlev - 1) & any_above
+    if redo.any():
+        lo_idx[redo] = _last_bracket(vcoord, levs, decr, redo)
+
+    found = (lo_idx >= 0) & (lo_idx < nlev - 1)
+    lo_idx = np.clip(lo_idx, 0, nlev - 2)
+    v_lo = _take_levels(vcoord, lo_idx)
+    v_hi = _take_levels(vcoord, lo_idx + 1)
+
+    redo = found & ~np.isfinite(v_hi)
+    if redo.any():
+        redo_idx = _last_bracket(vcoord, levs, decr, redo)
+        found[redo] = redo_idx >= 0
+        lo_idx[redo] = np.clip(redo_idx, 0, nlev - 2)
+        v_lo = _take_levels(vcoord, lo_idx)
+        v_hi = _take_levels(vcoord, lo_idx + 1)
+
+    # Compute weights using the bracketing pair, NaN where the level isn't bracketed
+    wgt = levs - v_lo
+    wgt /= v_hi - v_lo
+    wgt[~found] = np.nan
+
+    return (lo_idx.reshape(col_shape + (nlevs, )),
+            wgt.reshape(col_shape + (nlevs, )))
+
+
+def _take_levels(data, idx):
+    """Select `idx` along the last axis of 2-D `data`, for each of its rows."""
+    offset = np.arange(0, data.size, data.shape[-1])[:, np.newaxis]
+    return np.ravel(data).take(idx + offset)
+
+
+def _last_bracket(vcoord, levs, decr, subset):
+    """
+    Find the highest bracketing level by checking every level pair, for a subset.
 
     Parameters
     ----------
-    data : :class:`xarray.DataArray` (>= 2D)
-        array of data to be interpolated
-    vcoord : :class:`xarray.DataArray`
-        array representing the vertical structure
-        (height/pressure/PV/theta/etc.) of `data`. This should be >= 2D, and
-        data[levname].shape == vcoord[levname].shape
-    lev : float
-        Level, in same units as vcoord, to interpolate to
-    levname : string
-        Name of the vertical level coordinate variable upon
-        which to interpolate
+    vcoord : array_like
+        2-D array of the vertical coordinate (column, level)
+    levs : array_like
+        Target levels, broadcast to (column, target level)
+    decr : array_like
+        Flags for `vcoord` decreasing along its last axis (column, 1)
+    subset : array_like
+        Boolean array of (column, target level) points to find
 
     Returns
     -------
-    out_data : array_like, (data.shape[0], 1, \*data.shape[2:])
-        Data on `lev`
+    idx : array_like
+        1-D array of the index of the lower bracketing level at each of the points in
+        `subset`, -1 where there is no bracket
 
     """
-    # Slice shortcut dicts, above looks like [1:], below looks like [:-1]
-    _sabove = {levname: slice(1, None)}
-    _sbelow = {levname: slice(None, -1)}
+    nlev = vcoord.shape[-1]
+    col_idx, lev_idx = np.nonzero(subset)
+    cols = vcoord[col_idx]
+    lev = levs[col_idx, lev_idx][:, np.newaxis]
+    decr = decr[col_idx]
 
-    if inc_with_z(vcoord, levname) <= 0.8:
-        # Fewer than 80% of points are increasing with index, swap directions
-        _sbelow, _sabove = _sabove, _sbelow
+    below = np.where(decr, cols[:, :-1] > lev, cols[:, :-1] <= lev)
+    above = np.where(decr, cols[:, 1:] <= lev, cols[:, 1:] > lev)
+    bracket = below & above
 
-    # Original levels from vcoord, should match original levels from data
-    _olevs = vcoord[levname]
+    return np.where(bracket.any(axis=-1), nlev - 2 - bracket[:, ::-1].argmax(axis=-1),
+                    -1)
 
-    # Selection dictionary to map levelname to coordinates above / below
-    _coord_above = {levname: _olevs.isel(**_sabove)}
-    _coord_below = {levname: _olevs.isel(**_sbelow)}
 
-    # xarray.DataArray of booleans, true where the level "below" is less than
-    # or equal to the desired level, false everywhere else
-    below = (vcoord.isel(**_sbelow) <= lev).drop(levname)
+def _apply_brackets(data, idx, wgt):
+    """
+    Linearly interpolate `data` using brackets and weights from :func:`_bracket_search`.
 
-    # xarray.DataArray of booleans, true where the level "above" is
-    # greater than the desired level, false everywhere else
-    above = (vcoord.isel(**_sabove) > lev).drop(levname)
+    Parameters
+    ----------
+    data : array_like
+        N-D array of data, where the last axis is vertical, or 1-D array of data on
+        the vertical axis only
+    idx, wgt : array_like
+        Index of lower bracketing level, and weight of upper bracketing level
 
-    # Combine, this means select all points where
-    # vcoord[LEVEL - 1] <= lev && vcoord[LEVEL + 1] > lev
-    idx = xu.logical_and(above, below)
+    Returns
+    -------
+    out_data : array_like
+        `data` interpolated to the target levels, shape is same as `idx`
 
-    # This is vcoord[:, 1:, ...], wherever idx is true and NaN everywhere else
-    ix_ab = xr.where(idx.assign_coords(**_coord_above),
-                     vcoord.isel(**_sabove), np.nan)
+    """
+    if data.ndim == 1 or idx.ndim == 1:
+        # Either data or the brackets are the same in every column
+        data_lo = data[..., idx]
+        data_hi = data[..., idx + 1]
+    elif data.shape[:-1] == idx.shape[:-1]:
+        data = data.reshape(-1, data.shape[-1])
+        idx_2d = idx.reshape(data.shape[0], -1)
+        data_lo = _take_levels(data, idx_2d).reshape(idx.shape)
+        data_hi = _take_levels(data, idx_2d + 1).reshape(idx.shape)
+    else:
+        # Data must be broadcast against the brackets
+        n_dim = max(data.ndim, idx.ndim)
+        data = data.reshape((1, ) * (n_dim - data.ndim) + data.shape)
+        idx = idx.reshape((1, ) * (n_dim - idx.ndim) + idx.shape)
+        data_lo = np.take_along_axis(data, idx, axis=-1)
+        data_hi = np.take_along_axis(data, idx + 1, axis=-1)
 
-    # This is vcoord[:, :-1, ...], wherever idx is true and NaN everywhere else
-    ix_bl = xr.where(idx.assign_coords(**_coord_below),
-                     vcoord.isel(**_sbelow), np.nan)
+    # Equivalent to (1 - wgt) * data_lo + wgt * data_hi, with fewer temporary arrays
+    data_hi -= data_lo
+    out_data = wgt * data_hi
+    out_data += data_lo
+    return out_data
 
-    # Drop the coordinate information for the index xarrays, otherwise the
-    # maths won't work (+, -, /, *)
-    ix_ab = ix_ab.drop(levname)
-    ix_bl = ix_bl.drop(levname)
 
-    # Compute linear interpolation weights
-    wgt1 = ((lev - ix_bl) / (ix_ab - ix_bl))
-    wgt0 = 1.0 - wgt1
+def _vinterp_kernel(vcoord, *fields, vlevels=None, decreasing=None):
+    """
+    Interpolate `fields` to `vlevels` along the last axis, blockwise kernel of xrvinterp.
 
-    # Perform the linear interpolation, sum over all original levels, to
-    # eliminate the vertical dimension and remove all the NaNs
-    out = (wgt0 * data.isel(**_sbelow).drop(levname) +
-           wgt1 * data.isel(**_sabove).drop(levname)).sum(dim=levname)
+    Parameters
+    ----------
+    vcoord : array_like
+        Array of the vertical coordinate of `fields`, where the last axis is vertical,
+        and all others broadcast against each of `fields`
+    fields : array_like
+        Arrays of data to be interpolated, where the last axis is vertical
+    vlevels : array_like
+        1-D array of levels, in the same units as vcoord, to interpolate to
+    decreasing : bool, optional
+        Flag for `vcoord` decreasing along its last axis, if None, this is determined
+        for each column of `vcoord`
+
+    Returns
+    -------
+    out_data : array_like or tuple
+        Each of `fields` on `vlevels`, where the last axis is the new vertical axis,
+        a single array if there is only one field
 
-    return out
+    """
+    if decreasing is None:
+        decreasing = _column_decreasing(vcoord)
+    idx, wgt = _bracket_search(vcoord, vlevels, decreasing)
+    out_data = tuple(_apply_brackets(data, idx, wgt) for data in fields)
+    if len(out_data) == 1:
+        out_data = out_data[0]
+    return out_data
 
 
-def xrvinterp(data, vcoord, vlevs, levname, newlevname):
+def xrvinterp(data, vcoord, vlevs, levname, newlevname, decreasing=None):
     """
     Perform vertical interpolation for several levels for an :class:`xarray.DataArray`
 
@@ -392,45 +536,299 @@ def xrvinterp(data, vcoord, vlevs, levname, newlevname):
         which to interpolate
     newlevname : string
         Name of new vertical level coordinate variable
+    decreasing : bool, optional
+        Flag for `vcoord` decreasing along `levname`. Default is None, which
+        determines the direction of each column of `vcoord` separately
 
     Returns
     -------
     out_data : array_like, (data.shape[0], vlevs.shape[0], \*data.shape[2:])
-        Data on vlevels
+        Data on vlevels, NaN where a level is not bracketed by valid `vcoord` values,
+        so there is no extrapolation
 
     Notes
     -----
     If the input vertical coordinate data is increasing / decreasing with
     height in different places (e.g. potential vorticity across hemispheres),
-    mask data and compute each part separately then add them together
-    (if appropriate) or combine them, or whatever you'd like
-    to do with them. We're not the boss of you :)
+    the direction of each column is found from its first and last valid values,
+    unless `decreasing` is given.
+
+    For :class:`dask.array.Array` backed inputs, a single kernel is run on each
+    chunk, with `levname` as its core dimension, which produces all of `vlevs` at
+    once. So `levname` is not chunked, and the size of the task graph scales with
+    the number of chunks only.
+
+    """
+    return xrvinterp_multi([data], vcoord, vlevs, levname, newlevname, decreasing)[0]
+
+
+def xrvinterp_multi(fields, vcoord, vlevs, levname, newlevname, decreasing=None):
+    """
+    Vertically interpolate several DataArrays which share a vertical coordinate.
+
+    The bracketing levels and interpolation weights are found once for each chunk,
+    and used for every field, rather than once for each field with :func:`xrvinterp`.
+
+    Parameters
+    ----------
+    fields : list or dict
+        :class:`xarray.DataArray` of data to be interpolated, each as `data` in
+        :func:`xrvinterp`
+    vcoord :  :class:`xarray.DataArray`
+        array representing the vertical structure
+        (height/pressure/PV/theta/etc.) of all `fields`
+    vlevs : array_like (1D)
+        Levels, in same units as vcoord, to interpolate to
+    levname : string
+        Name of the vertical level coordinate variable upon
+        which to interpolate
+    newlevname : string
+        Name of new vertical level coordinate variable
+    decreasing : bool, optional
+        Flag for `vcoord` decreasing along `levname`. Default is None, which
+        determines the direction of each column of `vcoord` separately
+
+    Returns
+    -------
+    out_data : list or dict
+        Each of `fields` on vlevs, of the same type as `fields`, NaN where a level is
+        not bracketed by valid `vcoord` values
 
     """
-    # Use a list-comprehension to assemble all the vertical coordinates
-    intp = [_xrvinterp_single(data, vcoord, lev, levname) for lev in vlevs]
-    # Concatenate the length (vlevs.shape[0]) list of xarray.DataArrays
-    # The concat_dims is default, and avoids weirdness when data rank is small
-    # (e.g. data.ndim < vcoord.ndim). Assing vlevs to be the values
-    # for the new coordinate
-    intp = xr.concat(intp, dim=newlevname).assign_coords(**{newlevname: vlevs})
+    if isinstance(fields, dict):
+        names = list(fields.keys())
+        fields = [fields[name] for name in names]
+    else:
+        names = None
+
+    vlevs = np.atleast_1d(vlevs)
+
+    # Use a temporary name for the output dimension, since the new level
+    # dimension may have the same name as the old one, but not the same size
+    _outdim = '{}_interp'.format(newlevname)
+    intp = xr.apply_ufunc(
+        _vinterp_kernel,
+        vcoord,
+        *fields,
+        input_core_dims=[[levname]] * (len(fields) + 1),
+        output_core_dims=[[_outdim]] * len(fields),
+        exclude_dims={levname},
+        dask='parallelized',
+        output_dtypes=[np.result_type(data.dtype, vcoord.dtype, np.float32)
+                       for data in fields],
+        dask_gufunc_kwargs={'output_sizes': {_outdim: vlevs.shape[0]},
+                            'allow_rechunk': True},
+        kwargs={'vlevels': vlevs, 'decreasing': decreasing},
+    )
+    if len(fields) == 1:
+        # apply_ufunc does not return a tuple for a single output
+        intp = (intp, )
 
     # Transpose the data, so the new level dimension is where the old level
     # dimension used to be in the original data or vcoord xarray.DataArray
     # depending on which has higher rank
-    if data.ndim > vcoord.ndim:
-        _dims = list(data.dims)
+    _dims = list(max([vcoord] + fields, key=lambda data: data.ndim).dims)
+    _dims[_dims.index(levname)] = newlevname
+
+    out_data = []
+    for data, data_intp in zip(fields, intp):
+        data_intp = data_intp.rename({_outdim: newlevname})
+        data_intp = data_intp.assign_coords(**{newlevname: vlevs})
+        out_data.append(data_intp.transpose(*_dims, ...))
+
+    if names is not None:
+        out_data = dict(zip(names, out_data))
+
+    return out_data
+
+
+def first_crossing(vcoord, lev, decreasing=False):
+    """
+    Find the first crossing of `lev` by `vcoord` in each column, from the top down.
+
+    Parameters
+    ----------
+    vcoord : array_like
+        N-D array of the vertical coordinate, where the last axis is vertical, and the
+        last level is the top of the column
+    lev : float
+        Value of `vcoord` to find
+    decreasing : bool
+        Flag for `vcoord` decreasing with height, so "below" `lev` is vcoord > lev
+
+    Returns
+    -------
+    idx : array_like
+        Index of the level below the crossing, where ``vcoord[..., idx]`` is below
+        `lev` and ``vcoord[..., idx + 1]`` is above it, -1 where there is no crossing,
+        shape is ``vcoord.shape[:-1]``
+    wgt : array_like
+        Linear interpolation weight for the level at ``idx + 1``, NaN where there is
+        no crossing
+
+    Notes
+    -----
+    The highest crossing is used where a column crosses `lev` more than once, so a
+    tropopause fold beneath the dynamical tropopause is ignored.
+
+    """
+    lev = np.asarray(lev).astype(np.result_type(vcoord.dtype, np.float32), copy=False)
+    if decreasing:
+        below = vcoord > lev
     else:
-        _dims = list(vcoord.dims)
+        below = vcoord <= lev
+    above = np.isfinite(vcoord) & ~below
+
+    # Reverse the crossings so that argmax finds the first crossing from the top
+    cross = (below[..., :-1] & above[..., 1:])[..., ::-1]
+    found = cross.any(axis=-1)
+    idx = np.where(found, cross.shape[-1] - 1 - cross.argmax(axis=-1), -1)
+
+    idx_c = np.clip(idx, 0, None)[..., None]
+    v_lo = np.take_along_axis(vcoord, idx_c, axis=-1)[..., 0]
+    v_hi = np.take_along_axis(vcoord, idx_c + 1, axis=-1)[..., 0]
+    wgt = lev - v_lo
+    wgt /= v_hi - v_lo
+    wgt[~found] = np.nan
 
-    lix = _dims.index(levname)
-    _dims[lix] = newlevname
-    intp = intp.transpose(*_dims)
+    return idx, wgt
 
-    # Use where to mask out values that are extrapolated
-    intp = intp.where(intp <= data.max()).where(intp >= data.min())
 
-    return intp
+def _first_crossing_kernel(vcoord, *fields, lev=None, decreasing=False):
+    """Blockwise kernel of :func:`xrfirst_crossing`, returns (idx, \*fields on `lev`)."""
+    idx, wgt = first_crossing(vcoord, lev, decreasing)
+    idx_c = np.clip(idx, 0, None)[..., None]
+    return (idx, ) + tuple(_apply_brackets(data, idx_c, wgt[..., None])[..., 0]
+                           for data in fields)
+
+
+def xrfirst_crossing(fields, vcoord, lev, levname, decreasing=False):
+    """
+    Interpolate `fields` to the first crossing of `lev` by `vcoord` from the top down.
+
+    Parameters
+    ----------
+    fields : list
+        :class:`xarray.DataArray` of data to be interpolated, with `levname` dimension
+    vcoord : :class:`xarray.DataArray`
+        array of the vertical coordinate (e.g. PV) of all `fields`, where the last
+        level along `levname` is the top of the column
+    lev : float
+        Value of `vcoord` (e.g. 2 PVU) to find
+    levname : string
+        Name of the vertical level coordinate variable
+    decreasing : bool
+        Flag for `vcoord` decreasing with height (e.g. PV in the southern hemisphere)
+
+    Returns
+    -------
+    idx : :class:`xarray.DataArray`
+        Index along `levname` of the level below the crossing, -1 where there is
+        no crossing
+    out_data : list
+        Each of `fields` on the `lev` surface, NaN where there is no crossing
+
+    """
+    out = xr.apply_ufunc(
+        _first_crossing_kernel,
+        vcoord,
+        *fields,
+        input_core_dims=[[levname]] * (len(fields) + 1),
+        output_core_dims=[[]] * (len(fields) + 1),
+        dask='parallelized',
+        output_dtypes=([int] + [np.result_type(data.dtype, vcoord.dtype, np.float32)
+                                for data in fields]),
+        dask_gufunc_kwargs={'allow_rechunk': True},
+        kwargs={'lev': lev, 'decreasing': decreasing},
+    )
+    return out[0], list(out[1:])
+
+
+def lowest_valid(data, axis=-1):
+    """
+    Get the first finite value along an axis of N-D data, for all columns at once.
+
+    Parameters
+    ----------
+    data : array_like
+        N-D array of data, where the first element along `axis` is the lowest level
+    axis : integer
+        Axis of `data` along which to search
+
+    Returns
+    -------
+    data_valid : array_like
+        (N-1)-D array of the first finite value of each column of `data`, the first
+        value of the column (NaN) where there are no finite values
+
+    """
+    data = np.asarray(data)
+    idx = np.expand_dims(np.isfinite(data).argmax(axis=axis), axis)
+    return np.take_along_axis(data, idx, axis=axis).squeeze(axis=axis)
+
+
+def xrlowest_valid(data, levname):
+    """
+    Get the lowest valid level of each column of an :class:`xarray.DataArray`.
+
+    Parameters
+    ----------
+    data : :class:`xarray.DataArray`
+        N-D array of data, where the first level along `levname` is the lowest
+    levname : string
+        Name of the vertical level coordinate variable
+
+    Returns
+    -------
+    data_valid : :class:`xarray.DataArray`
+        `data` on the first level along `levname` where it is finite, for each
+        column, with the `levname` dimension dropped
+
+    """
+    return xr.apply_ufunc(
+        lowest_valid,
+        data,
+        input_core_dims=[[levname]],
+        dask='parallelized',
+        output_dtypes=[data.dtype],
+        dask_gufunc_kwargs={'allow_rechunk': True},
+        kwargs={'axis': -1},
+    )
+
+
+def _cubic_operator(x_in, x_out):
+    """
+    Make matrix which interpolates data on `x_in` to `x_out` using a cubic spline.
+
+    Parameters
+    ----------
+    x_in : array_like
+        1-D source coordinate, at least 4 points, need not be sorted
+    x_out : array_like
+        1-D target coordinate, values outside of `x_in` take the nearest edge value
+
+    Returns
+    -------
+    operator : array_like
+        (x_out.shape[0], x_in.shape[0]) array, so ``operator @ data`` interpolates
+        `data` on `x_in` to sorted `x_out`
+
+    Notes
+    -----
+    The operator is found by interpolating the identity matrix, which is the same as
+    interpolating each unit vector, with a not-a-knot cubic spline. As the spline is
+    linear in the data, it is applied to any data on `x_in` by matrix multiplication.
+
+    """
+    order = np.argsort(x_in)
+    basis = interp.make_interp_spline(x_in[order], np.eye(x_in.shape[0])[order], k=3)
+    x_out = np.clip(np.sort(x_out), x_in.min(), x_in.max())
+    return basis(x_out)
+
+
+def _apply_operators(data, op_theta, op_lat):
+    """Apply interpolation operators to the last two (theta, lat) axes of `data`."""
+    return np.matmul(np.matmul(op_theta, data), op_lat.T)
 
 
 def interp_nd(lat, theta_in, data, lat_hr, theta_hr):
@@ -456,58 +854,233 @@ def interp_nd(lat, theta_in, data, lat_hr, theta_hr):
         Interpolated data where lat/theta dimensions are interpolated to `lat_hr` and
         `theta_hr`
 
+    Notes
+    -----
+    This is a bicubic spline interpolation, as with
+    :class:`scipy.interpolate.interp2d`, output is on sorted `lat_hr` and `theta_hr`,
+    and points outside of the input grid take the value at its edge. The spline
+    weights are computed once for each axis, then applied to all other dimensions
+    of `data` at once. If latitude and theta are the same size, theta is assumed to
+    be the first of those dimensions.
+
+    """
+    lat_dims = np.where(np.array(data.shape) == lat.shape[0])[0]
+    theta_dims = np.where(np.array(data.shape) == theta_in.shape[0])[0]
+    if lat.shape[0] == theta_in.shape[0]:
+        theta_dim, lat_dim = theta_dims[:2]
+    else:
+        theta_dim, lat_dim = theta_dims[0], lat_dims[0]
+
+    op_lat = _cubic_operator(lat, lat_hr)
+    op_theta = _cubic_operator(theta_in, theta_hr)
+
+    data_interp = _apply_operators(np.moveaxis(data, (theta_dim, lat_dim), (-2, -1)),
+                                   op_theta, op_lat)
+
+    return np.moveaxis(data_interp, (-2, -1), (theta_dim, lat_dim))
+
+
+def xrinterp_nd(data, lat_hr, theta_hr, dimvars=None):
+    """
+    Perform bicubic interpolation on latitude and theta for :class:`xarray.DataArray`.
+
+    Parameters
+    ----------
+    data : :class:`xarray.DataArray`
+        Data to be interpolated to high-resolution grid, may be chunked along any
+        dimension other than latitude and theta
+    lat_hr : array_like
+        1-D latitude coordinate array that `data` is interpolated to
+    theta_hr : array_like
+        1-D vertical coordinate array that `data` is interpolated to
+    dimvars : dict
+        Mapping of variable names for standard coordinates. This will default
+        to 'lev' -> 'level', 'lat' -> 'lat'
+
+    Returns
+    -------
+    data_interp : :class:`xarray.DataArray`
+        Interpolated data on sorted `lat_hr` and `theta_hr`, see :func:`interp_nd`
+
+    """
+    if dimvars is None:
+        dimvars = {'lev': 'level', 'lat': 'lat'}
+    vlev, vlat = dimvars['lev'], dimvars['lat']
+
+    lat_hr = np.sort(lat_hr)
+    theta_hr = np.sort(theta_hr)
+    op_lat = _cubic_operator(data[vlat].values, lat_hr)
+    op_theta = _cubic_operator(data[vlev].values, theta_hr)
+
+    # Use temporary names for the output dimensions, as they have the same names as
+    # the input dimensions, but not the same size
+    _outdims = ['{}_interp'.format(vlev), '{}_interp'.format(vlat)]
+    data_interp = xr.apply_ufunc(
+        _apply_operators,
+        data,
+        input_core_dims=[[vlev, vlat]],
+        output_core_dims=[_outdims],
+        exclude_dims={vlev, vlat},
+        dask='parallelized',
+        output_dtypes=[np.result_type(data.dtype, op_lat.dtype)],
+        dask_gufunc_kwargs={'output_sizes': {_outdims[0]: theta_hr.shape[0],
+                                             _outdims[1]: lat_hr.shape[0]},
+                            'allow_rechunk': True},
+        kwargs={'op_theta': op_theta, 'op_lat': op_lat},
+    )
+    data_interp = data_interp.rename({_outdims[0]: vlev, _outdims[1]: vlat})
+    data_interp = data_interp.assign_coords(**{vlev: theta_hr, vlat: lat_hr})
+
+    return data_interp.transpose(*data.dims)
+
+
+def poly_deriv_operator(xdata, valid, deg, vander, der, deriv=1):
+    """
+    Make matrix which fits a polynomial to valid data and evaluates its derivative.
+
+    Parameters
+    ----------
+    xdata : array_like
+        1-D coordinate of data (e.g. latitude)
+    valid : array_like
+        1-D array of booleans, True where data on `xdata` are valid, at least one
+    deg : int
+        Degree of polynomial fit
+    vander : function
+        Pseudo-Vandermonde matrix of the polynomial series, for example
+        :func:`numpy.polynomial.chebyshev.chebvander`
+    der : function
+        Derivative of the polynomial series, for example
+        :func:`numpy.polynomial.chebyshev.chebder`
+    deriv : int
+        Order of the derivative
+
+    Returns
+    -------
+    operator : array_like
+        (xdata.shape[0], valid.sum()) array, so ``operator @ data[valid]`` is the
+        `deriv`-th derivative, with respect to `xdata`, of the least squares fit to
+        `data[valid]`, at every point of `xdata`
+
+    Notes
+    -----
+    `xdata` is mapped onto [-1, 1], the natural domain of the series, so the fit is
+    well conditioned. The fit is the pseudo-inverse of the Vandermonde matrix at valid
+    points, the derivative of each basis polynomial (columns of the identity) is
+    evaluated on all points, so the product of the two goes from data to derivative.
+
     """
-    lat_dim = np.where(np.array(data.shape) == lat.shape[0])[0]
-    theta_dim = np.where(np.array(data.shape) == theta_in.shape[0])[0]
-    if data.ndim == 2:
-        data_f = interp.interp2d(lat, theta_in, data, kind='cubic')
-        data_interp = data_f(lat_hr, theta_hr)
+    # Map xdata onto [-1, 1], so d/d(xdata) = scl * d/d(x_map), a single point has no
+    # extent, so it is mapped to 0
+    span = (xdata.max() - xdata.min()) or 1.0
+    scl = 2.0 / span
+    x_map = scl * xdata - (xdata.max() + xdata.min()) / span
+    vand = vander(x_map, deg)
 
-    elif data.ndim == 3:
+    der_coef = der(np.eye(deg + 1), m=deriv, scl=scl)
+    return vand[:, :der_coef.shape[0]] @ der_coef @ np.linalg.pinv(vand[valid])
 
-        out_shape = list(data.shape)
-        out_shape[lat_dim] = lat_hr.shape[0]
-        out_shape[theta_dim] = theta_hr.shape[0]
 
-        data_interp = np.zeros(out_shape)
+@functools.lru_cache(maxsize=POLY_CACHE_SIZE)
+def _cached_deriv_operator(xdata, valid, deg, vander, der, deriv):
+    """Compute :func:`poly_deriv_operator` for (hashable) tuples of xdata and valid."""
+    operator = poly_deriv_operator(np.array(xdata), np.array(valid), deg, vander, der,
+                                   deriv)
+    # The same operator is returned for each call, so it must not be modified
+    operator.flags.writeable = False
+    return operator
 
-        #For contexts when you have a 3d array but 2 dimensions are the same.
-        cmn_axis = np.where(np.logical_and(np.array(data.shape) != lat.shape[0],
-                                           np.array(data.shape) != theta_in.shape[0]))[0]
-        # cmn_axis = np.where(out_shape == np.array(data.shape))[0]
-        for idx0 in range(data.shape[cmn_axis]):
 
-            data_f = interp.interp2d(lat, theta_in, data.take(idx0, axis=cmn_axis),
-                                     kind='cubic')
+def poly_deriv(xdata, data, deg, vander, der, deriv=1):
+    """
+    Fit polynomials to many profiles on the same grid, and evaluate their derivative.
 
-            slc = [slice(None)] * data_interp.ndim
-            slc[cmn_axis] = idx0
-            data_interp[slc] = data_f(lat_hr, theta_hr)
+    Parameters
+    ----------
+    xdata : array_like
+        1-D coordinate of all profiles (e.g. latitude)
+    data : array_like
+        N-D array of profiles, last axis matches `xdata`, may contain NaN
+    deg : int
+        Degree of polynomial fit
+    vander : function
+        Pseudo-Vandermonde matrix of the polynomial series, for example
+        :func:`numpy.polynomial.chebyshev.chebvander`
+    der : function
+        Derivative of the polynomial series, for example
+        :func:`numpy.polynomial.chebyshev.chebder`
+    deriv : int
+        Order of the derivative
 
-    elif data.ndim == 4:
+    Returns
+    -------
+    data_der : array_like
+        N-D array of `deriv`-th derivative of each fit with respect to `xdata`, same
+        shape as `data`, at every point of `xdata`, in the floating point precision of
+        `data`. NaN where a profile has no valid data
+
+    Notes
+    -----
+    Profiles are grouped by which of their points are valid, and each group is fit
+    and differentiated with one matrix product of its data and the operator from
+    :func:`poly_deriv_operator`, so if all data are valid, there is one product for
+    all profiles. Operators are kept for the `POLY_CACHE_SIZE` most recently used
+    combinations of `xdata`, valid points, `deg`, series and `deriv`, so they are
+    shared by every call with the same grid and fit (e.g. each hemisphere and year).
+
+    """
+    xdata = np.asarray(xdata, dtype=float)
+    out_shape = data.shape
+    data = data.reshape(-1, xdata.shape[0])
+
+    # Group profiles by valid points, with each profile's valid points packed into
+    # bytes, which are much quicker to compare than rows of booleans
+    valid = np.isfinite(data)
+    packed = np.packbits(valid, axis=-1)
+    keys, group = np.unique(packed.view(np.dtype((np.void, packed.shape[-1]))).ravel(),
+                            return_inverse=True)
+    patterns = np.unpackbits(keys.view(np.uint8).reshape(-1, packed.shape[-1]), axis=-1,
+                             count=valid.shape[-1]).astype(bool)
+
+    # Derivatives (and the product giving them) are in the precision of the data
+    dtype = np.result_type(data.dtype, np.float32)
+    data_der = np.full(data.shape, np.nan, dtype=dtype)
+    for idx, pattern in enumerate(patterns):
+        if not pattern.any():
+            continue
+        cols = group.reshape(-1) == idx
+        operator = _cached_deriv_operator(tuple(xdata.tolist()), tuple(pattern.tolist()),
+                                          deg, vander, der, deriv)
+        data_der[cols] = data[cols][:, pattern] @ operator.T.astype(dtype, copy=False)
 
-        out_shape = list(data.shape)
-        out_shape[lat_dim] = lat_hr.shape[0]
-        out_shape[theta_dim] = theta_hr.shape[0]
-        data_interp = np.zeros(out_shape)
+    return data_der.reshape(out_shape)
+
+
+def relative_extrema(data, comparator=np.greater):
+    """
+    Find relative extrema along the last axis of N-D data.
+
+    Parameters
+    ----------
+    data : array_like
+        N-D array in which to find extrema
+    comparator : function
+        Comparison of each point with its neighbours, :func:`numpy.greater` for maxima,
+        :func:`numpy.less` for minima
 
-        # For contexts when you have a 3d array but 2 dimensions are the same.
-        cmn_axis = np.where(np.logical_and(np.array(data.shape) != lat.shape[0],
-                                           np.array(data.shape) != theta_in.shape[0]))[0]
+    Returns
+    -------
+    extrema : array_like
+        N-D array of booleans, same shape as `data`, True where ``comparator`` is
+        True for a point and both of its neighbours along the last axis, so never at
+        the ends of the axis, as :func:`STJ_PV.kernels.argrelmax` / ``argrelmin``
 
-        # cmn_axis = np.where(out_shape == np.array(data.shape))[0][:]
-        for idx0 in range(data.shape[cmn_axis[0]]):
-            for idx1 in range(data.shape[cmn_axis[1]]):
-                data_slice = data.take(idx1, axis=cmn_axis[1]).take(idx0,
-                                                                    axis=cmn_axis[0])
-                data_f = interp.interp2d(lat, theta_in, data_slice, kind='cubic')
-                # slc says which axis to place interpolated array on, it's what changes
-                # with the loops
-                slc = [slice(None)] * data_interp.ndim
-                slc[cmn_axis[0]] = idx0
-                slc[cmn_axis[1]] = idx1
-                data_interp[slc] = data_f(lat_hr, theta_hr)
-    return data_interp
+    """
+    extrema = np.zeros(data.shape, dtype=bool)
+    inner = data[..., 1:-1]
+    extrema[..., 1:-1] = (comparator(inner, data[..., :-2]) &
+                          comparator(inner, data[..., 2:]))
+    return extrema
 
 
 def xrtheta(tair, pvar='level'):
@@ -540,8 +1113,8 @@ def xrtheta(tair, pvar='level'):
         # if pressure is in hPa (or similar), fix p_0
         p_0 /= 100.
 
-    # Compute and return theta
-    return tair * (p_0 / tair[pvar]) ** KPPA
+    # Compute and return theta, in the precision of tair
+    return tair * ((p_0 / tair[pvar]) ** KPPA).astype(tair.dtype)
 
 
 def theta(tair, pres):
@@ -578,7 +1151,7 @@ def theta(tair, pres):
         slice_idx[zaxis] = slice(None)
 
         # Create an array of pres so that its shape is (1, NPRES, 1, 1) if zaxis=1, ndim=4
-        p_axis = pres[slice_idx]
+        p_axis = pres[tuple(slice_idx)]
 
     return tair * (p_0 / p_axis) ** KPPA
 
@@ -650,7 +1223,7 @@ def inv_theta(thta, pres):
         slice_idx[zaxis] = slice(None)
 
         # Create an array of pres so that its shape is (1, NPRES, 1, 1) if zaxis=1, ndim=4
-        th_axis = thta[slice_idx]
+        th_axis = thta[tuple(slice_idx)]
 
     return th_axis * (p_0 / pres) ** -KPPA
 
@@ -664,7 +1237,11 @@ def lapse_rate(t_air, pres, vaxis=None):
     t_air : array_like
         N-D array of temperature on isobaric surfaces in K
     pres : array_like
-        1-D array of pressure levels, matching one dimension of t_air, in hPa
+        1-D array of pressure levels, matching one dimension of t_air, or N-D array
+        the same shape as t_air, in hPa or Pa
+    vaxis : integer, optional
+        Vertical axis of t_air, default is the first axis matching the length of 1-D
+        `pres`
 
     Returns
     -------
@@ -674,20 +1251,21 @@ def lapse_rate(t_air, pres, vaxis=None):
         N-D array of height differences in km between levels, same shape as t_air
 
     """
+    if pres.ndim not in (1, t_air.ndim):
+        raise ValueError('Dimensions do not match: T: {} P: {}'
+                         .format(t_air.ndim, pres.ndim))
+
     # Common axis is vertical axis
-    if pres.ndim == 1 or vaxis is None:
+    if vaxis is None:
         ax_com = t_air.shape.index(pres.shape[0])
-    elif pres.ndim == t_air.ndim:
-        ax_com = vaxis
     else:
-        raise ValueError('Dimensions do not match: T: {} P: {}'
-                         .format(t_air.ndim, pres.ndim))
+        ax_com = vaxis % t_air.ndim
 
     # Create slices to use that are correct shape
     slc_t = NDSlicer(ax_com, t_air.ndim)
     if pres.ndim == t_air.ndim:
         slc_p = NDSlicer(ax_com, pres.ndim)
-        bcast_nd = [slice(None)] * pres.ndim
+        bcast_nd = (slice(None), ) * pres.ndim
     else:
         slc_p = NDSlicer(0, pres.ndim)
         # This generates a list of length ndim of t_air, (if 4-D then
@@ -696,6 +1274,7 @@ def lapse_rate(t_air, pres, vaxis=None):
         # This makes the common axis (vertical) a slice, if ax_com = 1 then it is the
         # same as saying pres[None, :, None, None], but allowing ax_com to be automagic
         bcast_nd[ax_com] = slice(None)
+        bcast_nd = tuple(bcast_nd)
 
     # Calculate lapse rate in K/km
     d_p = (pres[slc_p.slice(1, None)] - pres[slc_p.slice(None, -1)])  # Units = Pa or hPa
@@ -707,12 +1286,14 @@ def lapse_rate(t_air, pres, vaxis=None):
         pres_fac = 1.0
 
     # rho = p / (Rd * T)
-    # Hydrostatic approximation dz = -dp/(rho * g)
-    d_z = -d_p[bcast_nd] / (((pres[bcast_nd] * pres_fac) /
-                             (R_D * t_air))[slc_t.slice(1, None)] * GRV) / 1000.0
+    # Hydrostatic approximation dz = -dp/(rho * g) = -dp * Rd * T / (p * g), the factor
+    # multiplying T is the shape of pres, so only d_z is the (full) shape of t_air [km]
+    dz_fac = -d_p * R_D / (pres[slc_p.slice(1, None)] * pres_fac * GRV * 1000.0)
+    d_z = t_air[slc_t.slice(1, None)] * dz_fac[bcast_nd].astype(t_air.dtype)
 
     # Lapse rate [K/km] (-dt / dz)
-    dtdz = -(t_air[slc_t.slice(1, None)] - t_air[slc_t.slice(None, -1)]) / d_z
+    dtdz = np.subtract(t_air[slc_t.slice(None, -1)], t_air[slc_t.slice(1, None)])
+    dtdz /= d_z
     return dtdz, d_z
 
 
@@ -738,71 +1319,78 @@ def trop_lev_1d(dtdz, d_z, thr=2.0, return_idx=False):
     out_mask : array_like
         1D array, same shape as `dtdz` and `d_z`, of booleans, `True` everywhere except
         the tropopause level
+    idx : array_like
+        Indices of the tropopause level(s), if `return_idx` is True
 
-    """
-    lt_thr = dtdz < thr
-    lt_transition = np.append(False, np.logical_and(np.logical_not(lt_thr[:-1]),
-                                                    lt_thr[1:]))
-
-    start_idx = np.where(np.logical_and(lt_thr, lt_transition))[0]
-    out_mask = np.array([True] * d_z.shape[0], dtype=bool)
-
-    for idx in start_idx:
-        try:
-            max_in_2km = dtdz[idx:idx + abs(np.cumsum(d_z[idx:]) - 2.0).argmin()].max()
-        except ValueError:
-            continue
+    Notes
+    -----
+    The column kernel is selected by :func:`STJ_PV.kernels.get_kernels`, using the
+    ``STJPV_KERNELS`` environment variable when this module is imported.
 
-        if max_in_2km <= thr:
-            out_mask[idx] = False
+    """
+    out_mask = _KERNELS.trop_lev_1d(dtdz, d_z, thr)
 
     if return_idx:
-        return out_mask, idx
+        return out_mask, np.where(~out_mask)[0]
     else:
         return out_mask
 
 
-def find_tropopause_mask(dtdz, d_z, thr=2.0):
+def find_tropopause_mask(dtdz, d_z, thr=2.0, vaxis=None):
     """
     Use Reichler et al. 2003 method to calculate tropopause level.
 
     Parameters
     ----------
     dtdz : array_like
-        1-D array of lapse rate in K/km
+        N-D array of lapse rate in K/km
     d_z : array_like
-        1-D array (same shape as `dtdz`) of difference in height between levels
+        N-D array (same shape as `dtdz`) of difference in height between levels
     thr : float
         Lapse rate threshold in K/km (WMO definition is 2.0 K/km)
+    vaxis : integer, optional
+        Vertical axis of `dtdz` and `d_z`, default is 0 for 1-D input, 1 otherwise
 
     Returns
     -------
-    trop_level : integer
-        Index of tropopause level on the vertical axis
-
-    """
-    # For now, we'll assume if 1-D data: vertical is dim 0, >= 2-D vertical is dim 1
-    # Loops are slow, but still can't figure out a way beyond them :-(
-    trop_level = np.empty(dtdz.shape, dtype=bool)
-    if dtdz.ndim == 1:
-        return trop_lev_1d(dtdz, d_z, thr)
-
-    elif dtdz.ndim == 2:
-        for ixt in range(dtdz.shape[0]):
-            trop_level[ixt, :] = trop_lev_1d(dtdz[ixt, :], d_z[ixt, :], thr)
-
-    elif dtdz.ndim == 3:
-        for ixt in range(dtdz.shape[0]):
-            for ixy in range(dtdz.shape[2]):
-                trop_level[ixt, :, ixy] = trop_lev_1d(dtdz[ixt, :, ixy], d_z[ixt, :, ixy],
-                                                      thr)
-    elif dtdz.ndim == 4:
-        for ixt in range(dtdz.shape[0]):
-            for ixy in range(dtdz.shape[2]):
-                for ixx in range(dtdz.shape[3]):
-                    trop_level[ixt, :, ixy, ixx] = trop_lev_1d(dtdz[ixt, :, ixy, ixx],
-                                                               d_z[ixt, :, ixy, ixx], thr)
-    return trop_level
+    trop_level : array_like
+        N-D array of booleans, same shape as `dtdz`, `True` everywhere except the
+        tropopause level(s) of each column, as :func:`trop_lev_1d`
+
+    Notes
+    -----
+    All columns are tested together, with a loop only over the vertical levels. For
+    each level where the lapse rate drops below `thr`, the layer tested is up to the
+    level with cumulative height nearest 2 km above it, the maximum lapse rate in that
+    layer is found from a running maximum along the vertical axis.
+
+    """
+    if vaxis is None:
+        vaxis = min(dtdz.ndim - 1, 1)
+    # Flatten to (column, level)
+    out_shape = np.moveaxis(dtdz, vaxis, -1).shape
+    nlev = out_shape[-1]
+    dtdz = np.moveaxis(dtdz, vaxis, -1).reshape(-1, nlev)
+    d_z = np.moveaxis(d_z, vaxis, -1).reshape(-1, nlev)
+
+    # Levels where lapse rate drops below threshold, from at or above it on the level
+    # before (NaN lapse rate is not below threshold)
+    lt_thr = dtdz < thr
+    start = np.zeros(dtdz.shape, dtype=bool)
+    start[:, 1:] = lt_thr[:, 1:] & ~lt_thr[:, :-1]
+
+    trop_level = np.ones(dtdz.shape, dtype=bool)
+    for lev in range(1, nlev - 1):
+        cols = np.nonzero(start[:, lev])[0]
+        # Number of levels in the layer from `lev` up to ~2 km above, if this is zero
+        # the layer is empty, and `lev` can't be the tropopause
+        n_win = np.abs(np.cumsum(d_z[cols, lev:], axis=-1) - 2.0).argmin(axis=-1)
+        max_lapse = np.maximum.accumulate(dtdz[cols, lev:], axis=-1)[
+            np.arange(cols.shape[0]), np.maximum(n_win - 1, 0)
+        ]
+        trop_level[cols, lev] = ~((n_win > 0) & (max_lapse <= thr))
+
+    return np.moveaxis(trop_level.reshape(out_shape), -1, vaxis)
 
 
 def get_tropopause(t_air, pres, thr=2.0, vaxis=1):
@@ -812,30 +1400,45 @@ def get_tropopause(t_air, pres, thr=2.0, vaxis=1):
     Parameters
     ----------
     t_air : array_like
-        ND array of temperature, where axis 1 is vertical axis
+        ND array of temperature, where axis `vaxis` is vertical axis, ordered from the
+        surface up
     pres : array_like
-        ND array of pressure levels, shape is same as `t_air`
+        1D array of pressure levels matching `vaxis` of `t_air`, or ND array the same
+        shape as `t_air`
     thr : float
         Lapse rate threshold, default/WMO definition is 2.0 K km^-1
+    vaxis : integer
+        Vertical axis of `t_air`
 
     Returns
     -------
-    trop_temp, trop_pres : array_like
-        Temperature and pressure at tropopause level, in (N-1)-D arrays, where dimension
-        dropped is vertical axis, same units as input t_air and pres respectively
+    trop_temp, trop_pres : :class:`numpy.ma.MaskedArray`
+        Temperature and pressure at the (lowest) tropopause level, in (N-1)-D arrays,
+        where dimension dropped is vertical axis, same units as input t_air and pres
+        respectively, masked where no tropopause is found
 
     """
+    vaxis = vaxis % t_air.ndim
+
     # Calculate the lapse rate, gives back lapse rate and d(height)
     dtdz, d_z = lapse_rate(t_air, pres, vaxis=vaxis)
 
     # Create tropopause level mask, use only the half levels (every other starting at 1)
-    trop_level_mask = find_tropopause_mask(dtdz[:, 1::2, ...], d_z[:, 1::2, ...], thr=thr)
+    half = NDSlicer(vaxis, t_air.ndim)[1::2]
+    trop_level_mask = find_tropopause_mask(dtdz[half], d_z[half], thr=thr, vaxis=vaxis)
+
+    # Index of the first tropopause level in each column, then get temperature and
+    # pressure from that level, rather than masking the full N-D arrays
+    trop_found = ~trop_level_mask.all(axis=vaxis)
+    trop_idx = np.expand_dims(trop_level_mask.argmin(axis=vaxis), vaxis)
+    trop_temp = np.take_along_axis(t_air[half], trop_idx, axis=vaxis).squeeze(vaxis)
+    if pres.ndim == 1:
+        trop_pres = pres[1::2][trop_idx.squeeze(vaxis)]
+    else:
+        trop_pres = np.take_along_axis(pres[half], trop_idx, axis=vaxis).squeeze(vaxis)
 
-    # To get the tropopause temp/pres, mask the 4D arrays (at every other level)
-    # then take the mean across level axis (now only one unmasked point) to give 3D data
-    trop_temp = np.mean(np.ma.masked_where(trop_level_mask, t_air[:, 1::2, ...]), axis=1)
-    trop_pres = np.mean(np.ma.masked_where(trop_level_mask, pres[:, 1::2, ...]), axis=1)
-    return trop_temp, trop_pres
+    return (np.ma.masked_where(~trop_found, trop_temp),
+            np.ma.masked_where(~trop_found, trop_pres))
 
 
 def get_tropopause_pres(t_air, pres, thr=2.0):
@@ -866,16 +1469,17 @@ def get_tropopause_pres(t_air, pres, thr=2.0):
     pres_full[::2] = pres
     pres_full[1::2] = pres_hf
 
-    # Interpolate temperature to half pressure levels
-    t_interp = interp.interp1d(pres, t_air, axis=1, kind='linear')(pres_full)
-
-    # Broadcast pres_full to 4D, but pressure axis has to be last axis for broadcast_to
-    # so, use temp shape, where index 1 and -1 are switched
-    temp_shape = list(t_interp.shape)
-    temp_shape[1], temp_shape[-1] = temp_shape[-1], temp_shape[1]
-    pres_full_4d = np.swapaxes(np.broadcast_to(pres_full, temp_shape), -1, 1)
+    # Linear interpolation in pressure to the half levels is the mean of the levels
+    # either side, fill these in between the input levels
+    slc = NDSlicer(1, t_air.ndim)
+    t_full = np.empty(t_air.shape[:1] + pres_full.shape + t_air.shape[2:],
+                      dtype=t_air.dtype)
+    t_full[slc[::2]] = t_air
+    np.add(t_air[slc[:-1]], t_air[slc[1:]], out=t_full[slc[1::2]])
+    t_full[slc[1::2]] *= 0.5
 
-    return get_tropopause(t_interp, pres_full_4d, thr=thr, vaxis=1)
+    # Pressure stays 1-D, lapse_rate and get_tropopause broadcast it along axis 1
+    return get_tropopause(t_full, pres_full, thr=thr, vaxis=1)
 
 
 def get_tropopause_theta(theta_in, pres, thr=2.0):
@@ -905,6 +1509,72 @@ def get_tropopause_theta(theta_in, pres, thr=2.0):
     return get_tropopause_pres(t_pres, pres_levs, thr=thr)
 
 
+def _trop_kernel(tair, pres=None, thr=2.0):
+    """WMO tropopause temperature and pressure of each column, vertical axis last."""
+    if pres[0] < pres[-1]:
+        # Lapse rate test goes up from the surface
+        tair = tair[..., ::-1]
+        pres = pres[::-1]
+    out_shape = tair.shape[:-1]
+    trop_temp, trop_pres = get_tropopause_pres(tair.reshape(-1, pres.shape[0]), pres,
+                                               thr=thr)
+    return (np.ma.filled(trop_temp, np.nan).reshape(out_shape).astype(tair.dtype),
+            np.ma.filled(trop_pres, np.nan).reshape(out_shape).astype(tair.dtype))
+
+
+def xr_get_tropopause(tair, dimvars=None, thr=2.0, pfac=None):
+    """
+    Return the tropopause temperature and pressure for WMO tropopause.
+
+    Parameters
+    ----------
+    tair : :class:`xarray.DataArray`
+        N-D array of temperature on pressure levels, in K
+    dimvars : dict
+        Mapping of variable names for standard coordinates. This will default
+        to 'lev' -> 'level'
+    thr : float
+        Lapse rate threshold, default/WMO definition is 2.0 K km^-1
+    pfac : float, optional
+        Multiply the vertical coordinate of `tair` by this to get pressure in Pa
+        (`pfac` in the data configuration). Default is None, which guesses from the
+        coordinate's `units` attribute, and uses Pa if there isn't one
+
+    Returns
+    -------
+    trop_temp, trop_pres : :class:`xarray.DataArray`
+        Temperature [K] and pressure [Pa] at tropopause level, where dimension dropped
+        is vertical dimension, NaN where no tropopause is found
+
+    Notes
+    -----
+    Each chunk of `tair` is computed separately with :func:`get_tropopause_pres`, so
+    `tair` may be chunked in any dimension except the vertical.
+
+    """
+    if dimvars is None:
+        dimvars = {'lev': 'level'}
+    vlev = dimvars['lev']
+
+    if pfac is None:
+        pfac = _pres_scale(tair[vlev])
+
+    # Pressure in hPa, lapse_rate assumes this if levels are all above 900 hPa
+    pres = tair[vlev].values * pfac / 100.0
+
+    trop_temp, trop_pres = xr.apply_ufunc(
+        _trop_kernel,
+        tair,
+        input_core_dims=[[vlev]],
+        output_core_dims=[[], []],
+        dask='parallelized',
+        output_dtypes=[tair.dtype, tair.dtype],
+        kwargs={'pres': pres, 'thr': thr},
+    )
+
+    return trop_temp, trop_pres * 100.0
+
+
 def diff_cfd(data, axis=-1, cyclic=False):
     """
     Calculate centered finite difference on a field along an axis with even spacing.
@@ -924,29 +1594,7 @@ def diff_cfd(data, axis=-1, cyclic=False):
         ND array of central finite differences of `data` along `axis`
 
     """
-    # Calculate centred differences along longitude direction
-    # Eqivalent to: diff = data[..., 2:] - data[..., :-2] for axis == -1
-    slc = NDSlicer(axis, data.ndim)
-    diff = data[slc[2:None]] - data[slc[None:-2]]
-
-    if cyclic:
-        # Cyclic boundary in "East"
-        # Equiv to diff[..., 0] = data[..., 1:2] - data[..., -1:]
-        d_1 = (data[slc[1:2]] - data[slc[-1:None]])
-        diff = np.append(d_1, diff, axis=axis)
-
-        # Cyclic boundary in "West"
-        # Equiv to diff[..., -1] = data[..., 0:1] - data[..., -2:-1]
-        diff = np.append(diff, (data[slc[0:1]] - data[slc[-2:-1]]), axis=axis)
-    else:
-        # Otherwise edges are forward/backward differences
-        # Boundary in "South", (data[..., 1:2] - data[..., 0:1])
-        diff = np.append((data[slc[1:2]] - data[slc[0:1]]), diff, axis=axis)
-
-        # Boundary in "North" (data[..., -1:] - data[..., -2:-1])
-        diff = np.append(diff, (data[slc[-1:None]] - data[slc[-2:-1]]), axis=axis)
-
-    return diff
+    return stencils.diff_cfd(data, axis=axis, cyclic=cyclic)
 
 
 def diff_cfd_xr(data, dim='lon', cyclic=False):
@@ -968,39 +1616,14 @@ def diff_cfd_xr(data, dim='lon', cyclic=False):
         N-D array of central finite differences
         of `data` along `axis`
 
-    """
-    # For centred differences along longitude direction (e.g.) this is
-    # eqivalent to: diff = data[..., 2:] - data[..., :-2] for axis == -1
-    diff = (data.isel(**{dim: slice(2, None)}).drop(dim)
-            - data.isel(**{dim: slice(None, -2)}).drop(dim))
-    diff = diff.assign_coords(**{dim: data[dim].isel(**{dim: slice(1, -1)})})
-
-    if cyclic:
-        # Cyclic boundary in "East"
-        # Equiv to diff[..., 0] = data[..., 1:2] - data[..., -1:]
-        d_1 = (data.isel(**{dim: 1}).drop(dim) -
-               data.isel(**{dim: -1})).drop(dim)
-
-        # Cyclic boundary in "West"
-        # Equiv to diff[..., -1] = data[..., 0:1] - data[..., -2:-1]
-        d_2 = (data.isel(**{dim: 0}).drop(dim) -
-               data.isel(**{dim: -2})).drop(dim)
-
-    else:
-        # Otherwise edges are forward/backward differences
-        # Boundary in "South", (data[..., 1:2] - data[..., 0:1])
-        d_1 = data.isel(**{dim: 1}) - data.isel(**{dim: 0})
-        d_2 = data.isel(**{dim: -1}) - data.isel(**{dim: -2})
-
-    # Assign the coordiate to each "point"
-    d_1 = d_1.assign_coords(**{dim: data[dim].isel(**{dim: 0})})
-    d_2 = d_2.assign_coords(**{dim: data[dim].isel(**{dim: -1})})
-
-    # Concatinate along the difference dimension
-    diff = xr.concat((d_1, diff, d_2), dim=dim)
+    Notes
+    -----
+    If `data` is a dask array, it may be chunked along `dim`. Each chunk is extended
+    by one point from each of its neighbours (or the opposite end of `dim` if
+    `cyclic`) so that each chunk is differenced independently.
 
-    # Use .transpose to make sure diff dims are same as data dims
-    return diff.transpose(*data.dims)
+    """
+    return stencils.xr_diff_cfd(data, dim=dim, cyclic=cyclic)
 
 
 def diffz(data, vcoord, axis=None):
@@ -1030,38 +1653,7 @@ def diffz(data, vcoord, axis=None):
         except ValueError:
             axis = vcoord.shape.index(data.shape[0])
 
-    # Create array to hold vertical derivative
-    dxdz = np.zeros(data.shape)
-
-    # Create an n-dimensional broadcast along matching axis, same as [None, :, None, None]
-    # for axis=1, ndim=4
-    if vcoord.ndim < data.ndim:
-        bcast = [np.newaxis] * data.ndim
-        bcast[axis] = slice(None)
-        d_z = (vcoord[1:] - vcoord[:-1])
-        d_z2 = d_z[:-1][bcast]
-        d_z1 = d_z[1:][bcast]
-        # Create n-dimensional slicer along matching axis
-        slc = NDSlicer(axis, data.ndim)
-    else:
-        slc_vc = NDSlicer(axis, vcoord.ndim)
-        d_z = (vcoord[slc_vc[1:None]] - vcoord[slc_vc[None:-1]])
-        d_z2 = d_z[slc_vc[None:-1]]
-        d_z1 = d_z[slc_vc[1:None]]
-        slc = NDSlicer(0, data.ndim)
-
-    dxdz[slc[1:-1]] = ((d_z2 * data[slc[2:None]] + (d_z1 - d_z2) * data[slc[1:-1]] -
-                        d_z1 * data[slc[None:-2]]) / (2.0 * d_z1 * d_z2))
-
-    # Do forward difference at 0th level [:, 1, :, :] - [:, 0, :, :]
-    dz1 = vcoord[1] - vcoord[0]
-    dxdz[slc[0:1]] = (data[slc[0:1]] - data[slc[1:2]]) / dz1
-
-    # Do backward difference at Nth level
-    dz1 = vcoord[-1] - vcoord[-2]
-    dxdz[slc[-1:None]] = (data[slc[-1:None]] - data[slc[-2:-1]]) / dz1
-
-    return dxdz
+    return stencils.diffz(data, vcoord, axis=axis)
 
 
 def xrdiffz(data, vcoord, dim='lev'):
@@ -1084,37 +1676,7 @@ def xrdiffz(data, vcoord, dim='lev'):
         N-D array of d(data)/d(vcoord), same shape as input `data`
 
     """
-    d_z = (vcoord.isel(**{dim: slice(1, None)}).drop(dim) -
-           vcoord.isel(**{dim: slice(None, -1)}).drop(dim))
-    d_z1 = d_z.isel(**{dim: slice(1, None)})
-    d_z2 = d_z.isel(**{dim: slice(None, -1)})
-
-    # Central difference for uneven levels
-
-    diff = ((d_z2 * data.isel(**{dim: slice(2, None)}).drop(dim) +
-             (d_z1 - d_z2) * data.isel(**{dim: slice(1, -1)}).drop(dim) -
-             d_z1 * data.isel(**{dim: slice(None, -2)}).drop(dim)) /
-            (2.0 * d_z1 * d_z2))
-    diff = diff.assign_coords(**{dim: data[dim].isel(**{dim: slice(1, -1)})})
-
-    # Do forward difference at 0th level [:, 1, :, :] - [:, 0, :, :]
-    dz1 = (vcoord.isel(**{dim: 1}).drop(dim) -
-           vcoord.isel(**{dim: 0}).drop(dim))
-    diff_0 = (data.isel(**{dim: 1}).drop(dim) -
-              data.isel(**{dim: 0}).drop(dim)) / dz1
-    diff_0 = diff_0.assign_coords(**{dim: data[dim].isel(**{dim: 0})})
-
-    # Do backward difference at Nth level
-    dz2 = (vcoord.isel(**{dim: -1}).drop(dim) -
-           vcoord.isel(**{dim: -2}).drop(dim))
-    diff_1 = (data.isel(**{dim: -1}).drop(dim) -
-              data.isel(**{dim: -2}).drop(dim)) / dz2
-    diff_1 = diff_1.assign_coords(**{dim: data[dim].isel(**{dim: -1})})
-
-    # Combine all the differences
-    diff = xr.concat((diff_0, diff, diff_1), dim=dim)
-
-    return diff.transpose(*data.dims)
+    return stencils.xrdiffz(data, vcoord, dim=dim)
 
 
 def convert_radians_latlon(lat, lon):
@@ -1152,52 +1714,153 @@ def convert_radians_latlon(lat, lon):
     return lat_out, lon_out
 
 
-def dlon_dlat(lon, lat, cyclic=True):
+class GridGeometry(object):
+    """
+    Metric factors of a spherical latitude / longitude grid.
+
+    Parameters
+    ----------
+    lat : array_like
+        1D latitude, in degrees or radians
+    lon : array_like
+        1D longitude, in degrees or radians
+    cyclic : bool
+        Flag to indicate if the grid is cyclic in longitude direction
+
+    Attributes
+    ----------
+    lat, lon : array_like
+        1D latitude and longitude in radians
+    coslat : array_like
+        1D cosine of latitude
+    f_cor : array_like
+        1D Coriolis parameter 2 * OM * sin(lat) [s^-1]
+    dlon, dlat : array_like
+        1D centred differences of longitude and latitude [radians], forward / backward
+        at the edges, or for cyclic longitude, the difference of their neighbours
+    dlong, dlatg : array_like
+        NLat x NLon arrays of horizontal distances along longitude and latitude [m]
+
+    Notes
+    -----
+    Use :func:`grid_geometry` to get an instance, which computes these once per grid.
+
+    """
+
+    def __init__(self, lat, lon, cyclic=True):
+        """Compute metric factors for `lat`, `lon` grid."""
+        self.lat, self.lon = convert_radians_latlon(np.asarray(lat, dtype=float),
+                                                    np.asarray(lon, dtype=float))
+        self.cyclic = cyclic
+
+        self.coslat = np.cos(self.lat)
+        self.f_cor = 2.0 * OM * np.sin(self.lat)
+
+        self.dlat = stencils.diff_cfd(self.lat)
+        self.dlon = stencils.diff_cfd(self.lon)
+        if cyclic:
+            # Endpoints should be central not fwd/bkw diffs, so assume that the grid
+            # is regular and repeat their neighbours
+            self.dlon[0] = self.dlon[1]
+            self.dlon[-1] = self.dlon[-2]
+
+        self.dlong = EARTH_R * self.coslat[:, np.newaxis] * self.dlon[np.newaxis, :]
+        self.dlatg = EARTH_R * np.repeat(self.dlat[:, np.newaxis], self.lon.shape[0],
+                                         axis=1)
+
+    def to_dataset(self, vlat='lat', vlon='lon'):
+        """
+        Get 1D metric factors as a :class:`xarray.Dataset`, to be stored with data.
+
+        Parameters
+        ----------
+        vlat, vlon : string
+            Variable names of latitude and longitude
+
+        Returns
+        -------
+        geometry : :class:`xarray.Dataset`
+            Dataset of `coslat`, `f_cor`, `dlat` on `vlat` and `dlon` on `vlon`
+
+        """
+        geometry = {
+            'coslat': ((vlat, ), self.coslat, {'long_name': 'cosine of latitude'}),
+            'f_cor': ((vlat, ), self.f_cor, {'units': 's-1',
+                                             'long_name': 'Coriolis parameter'}),
+            'dlat': ((vlat, ), self.dlat, {'units': 'radians',
+                                           'long_name': 'latitude difference'}),
+            'dlon': ((vlon, ), self.dlon, {'units': 'radians',
+                                           'long_name': 'longitude difference'})
+        }
+        return xr.Dataset(geometry, coords={vlat: self.lat / RAD, vlon: self.lon / RAD},
+                          attrs={'cyclic': int(self.cyclic)})
+
+
+@functools.lru_cache(maxsize=GEOMETRY_CACHE_SIZE)
+def _cached_geometry(lat, lon, cyclic):
+    """Compute :class:`GridGeometry` for (hashable) tuples of latitude and longitude."""
+    return GridGeometry(np.array(lat), np.array(lon), cyclic)
+
+
+def grid_geometry(lat, lon, cyclic=True):
+    """
+    Get metric factors for a latitude / longitude grid, computed once per grid.
+
+    Parameters
+    ----------
+    lat : array_like
+        1D latitude, in degrees or radians
+    lon : array_like
+        1D longitude, in degrees or radians
+    cyclic : bool
+        Flag to indicate if the grid is cyclic in longitude direction
+
+    Returns
+    -------
+    geom : :class:`GridGeometry`
+        Metric factors for the grid. These are kept for the `GEOMETRY_CACHE_SIZE`
+        most recently used grids, and must not be modified
+
+    """
+    return _cached_geometry(tuple(np.asarray(lat, dtype=float).tolist()),
+                            tuple(np.asarray(lon, dtype=float).tolist()), cyclic)
+
+
+def dlon_dlat(lon, lat, cyclic=True, geom=None):
     """
     Calculate distance along lat/lon axes on spherical grid.
 
     Parameters
     ----------
     lat : array_like
-        ND array of latitude
+        1D array of latitude
     lon : array_like
-        ND array of longitude
+        1D array of longitude
+    cyclic : bool
+        Flag to indicate if data is cyclic in longitude direction
+    geom : :class:`GridGeometry`, optional
+        Metric factors for the grid, default is from :func:`grid_geometry`
 
     Returns
     ----------
     dlong : array_like
-        NLat x Nlon array of horizontal distnaces along longitude axis
+        NLat x Nlon array of horizontal distnaces along longitude axis, if not cyclic
+        the first and last longitudes are omitted
     dlatg : array_like
-        NLat x Nlon array of horizontal distnaces along latitude axis
+        NLat x Nlon array of horizontal distnaces along latitude axis, same shape
+        as `dlong`
 
     """
-    # Check that lat/lon are in radians
-    lat, lon = convert_radians_latlon(lat, lon)
+    if geom is None:
+        geom = grid_geometry(lat, lon, cyclic)
 
-    # Calculate centre finite difference of lon / lat
-    dlon = lon[2:] - lon[:-2]
-    dlat = lat[2:] - lat[:-2]
-
-    # If we want cyclic data, repeat dlon[0] and dlon[-1] at edges
     if cyclic:
-        dlon = np.append(dlon[0], dlon)      # cyclic boundary in East
-        dlon = np.append(dlon, dlon[-1])     # cyclic boundary in West
-        lon2d, lat2d = np.meshgrid(lon, lat)
+        return geom.dlong, geom.dlatg
     else:
-        lon2d, lat2d = np.meshgrid(lon[1:-1], lat)
-
-    dlat = np.append(lat[1] - lat[0], dlat)    # boundary in South
-    dlat = np.append(dlat, lat[-1] - lat[-2])  # boundary in North
-    dlong, dlatg = np.meshgrid(dlon, dlat)
-
-    # Lon/Lat differences in spherical coords
-    dlong = dlong * EARTH_R * np.cos(lat2d)
-    dlatg = dlatg * EARTH_R
-
-    return dlong, dlatg
+        return geom.dlong[:, 1:-1], geom.dlatg[:, 1:-1]
 
 
-def xr_dlon_dlat(data, vlon='lon', vlat='lat', cyclic=True):
+def xr_dlon_dlat(data, vlon='lon', vlat='lat', cyclic=True, geom=None):
     """
     Calculate distance on lat/lon axes on spherical grid for :class:`xarray.DataArray`
 
@@ -1207,6 +1870,10 @@ def xr_dlon_dlat(data, vlon='lon', vlat='lat', cyclic=True):
         DataArray with latitude and longitude coordinates
     vlon, vlat : string
         Variable names of latitude and longitude
+    cyclic : bool
+        Flag to indicate if data is cyclic in longitude direction
+    geom : :class:`GridGeometry`, optional
+        Metric factors for the grid, default is from :func:`grid_geometry`
 
     Returns
     ----------
@@ -1218,26 +1885,17 @@ def xr_dlon_dlat(data, vlon='lon', vlat='lat', cyclic=True):
         along latitude axis in m
 
     """
-    lon = data[vlon]
-    lat = data[vlat]
-
-    lon, lat = convert_radians_latlon(lon, lat)
-    dlon = diff_cfd_xr(lon, dim=vlon, cyclic=False).compute()
-    if cyclic:
-        # If cyclic, the endpoints are central not fwd/bkw diffs, so assume
-        # that the grid is regular, and double the edges
-        dlon[0] *= 2
-        dlon[-1] *= 2
-
-    dlat = diff_cfd_xr(lat, dim=vlat, cyclic=False)
+    if geom is None:
+        geom = grid_geometry(data[vlat].values, data[vlon].values, cyclic)
 
-    dlon = dlon * EARTH_R * lat.pipe(np.cos)
-    dlat = dlat * EARTH_R
+    dlon = xr.DataArray(geom.dlong, dims=(vlat, vlon),
+                        coords={vlat: data[vlat], vlon: data[vlon]})
+    dlat = xr.DataArray(EARTH_R * geom.dlat, dims=(vlat, ), coords={vlat: data[vlat]})
 
     return dlon, dlat
 
 
-def rel_vort(uwnd, vwnd, lat, lon, cyclic=True):
+def rel_vort(uwnd, vwnd, lat, lon, cyclic=True, geom=None):
     r"""
     Calculate the relative vorticity given zonal (uwnd) and meridional (vwnd) winds.
 
@@ -1253,6 +1911,8 @@ def rel_vort(uwnd, vwnd, lat, lon, cyclic=True):
         Longitude array, 1 dimensional with lon.shape[0] == uwnd.shape[-1]
     cyclic : boolean
         Flag to indicate if data is cyclic in longitude direction
+    geom : :class:`GridGeometry`, optional
+        Metric factors for the grid, default is from :func:`grid_geometry`
 
     Returns
     -------
@@ -1262,11 +1922,8 @@ def rel_vort(uwnd, vwnd, lat, lon, cyclic=True):
         ``(*vwnd.shape[0:-1], vwnd.shape[-1] - 2)``
 
     """
-    # Check that lat/lon are in radians
-    lat, lon = convert_radians_latlon(lat, lon)
-
     # Get dlon and dlat in spherical coords
-    dlong, dlatg = dlon_dlat(lon, lat, cyclic)
+    dlong, dlatg = dlon_dlat(lon, lat, cyclic, geom=geom)
 
     # Generate quasi-broadcasts of lat/lon differences for divisions
     if uwnd.ndim == 4:
@@ -1298,7 +1955,7 @@ def rel_vort(uwnd, vwnd, lat, lon, cyclic=True):
     return dvdlon - dudlat
 
 
-def xr_rel_vort(uwnd, vwnd, dimvars, cyclic=True):
+def xr_rel_vort(uwnd, vwnd, dimvars, cyclic=True, geom=None):
     r"""
     Calculate the relative vorticity given zonal (u) and meridional (v) winds.
 
@@ -1310,6 +1967,8 @@ def xr_rel_vort(uwnd, vwnd, dimvars, cyclic=True):
         Array of Meridional wind with same dimensions as uwnd
     cyclic : boolean
         Flag to indicate if data is cyclic in longitude direction
+    geom : :class:`GridGeometry`, optional
+        Metric factors for the grid, default is from :func:`grid_geometry`
 
     Returns
     -------
@@ -1324,15 +1983,15 @@ def xr_rel_vort(uwnd, vwnd, dimvars, cyclic=True):
     vlat = dimvars.get('lat', 'lat')
 
     # Get dlon and dlat in spherical coords
-    dlong, dlatg = xr_dlon_dlat(uwnd, vlon=vlon, vlat=vlat, cyclic=cyclic)
+    dlong, dlatg = xr_dlon_dlat(uwnd, vlon=vlon, vlat=vlat, cyclic=cyclic, geom=geom)
 
     dvwnd = diff_cfd_xr(vwnd, dim=vlon, cyclic=cyclic)
     duwnd = diff_cfd_xr(uwnd, dim=vlat, cyclic=False)
 
     # Divide vwnd differences by longitude differences
-    dvdlon = dvwnd / dlong
+    dvdlon = dvwnd / dlong.astype(vwnd.dtype)
     # Divide uwnd differences by latitude differences
-    dudlat = duwnd / dlatg
+    dudlat = duwnd / dlatg.astype(uwnd.dtype)
 
     return dvdlon - dudlat
 
@@ -1355,35 +2014,30 @@ def dth_dp(theta_in, data_in):
         bottom/top boundaries
 
     """
-    # Calculate centred finite differences for theta (1D) and data on theta lvls (>=2D)
-    dth = theta_in[2:] - theta_in[:-2]
-    ddata = data_in[:, 2:, ...] - data_in[:, :-2, ...]
-
-    # Calculated backward finite difference for bottom and top layers
-    dth = np.append(theta_in[1] - theta_in[0], dth)
-    dth = np.append(dth, theta_in[-1] - theta_in[-2])
-    ddata = np.append((data_in[:, 1, ...] - data_in[:, 0, ...])[:, np.newaxis, ...],
-                      ddata, axis=1)
-    ddata = np.append(ddata, (data_in[:, -1, ...] -
-                              data_in[:, -2, ...])[:, np.newaxis, ...], axis=1)
-
-    if data_in.ndim == 4:
-        return dth[np.newaxis, :, np.newaxis, np.newaxis] / ddata
-    elif data_in.ndim == 3:
-        return dth[np.newaxis, :, np.newaxis] / ddata
-    elif data_in.ndim == 2:
-        return dth[np.newaxis, :] / ddata
-    else:
+    if data_in.ndim not in (2, 3, 4):
         raise ValueError('Incorrect number of dimensons: {}'.format(data_in.shape))
 
+    # Centred finite differences for theta (1D) and data on theta lvls (>=2D), with
+    # forward / backward differences for bottom / top layers
+    dth = stencils.diff_cfd(theta_in)
+    ddata = stencils.diff_cfd(data_in, axis=1)
+
+    bcast = [np.newaxis] * data_in.ndim
+    bcast[1] = slice(None)
+    if not np.issubdtype(ddata.dtype, np.floating):
+        # Differences of integer data can't hold the quotient, so it is a new array
+        return np.divide(dth[tuple(bcast)], ddata)
+    return np.divide(dth[tuple(bcast)], ddata, out=ddata)
+
 
-def ipv(uwnd, vwnd, tair, pres, lat, lon, th_levels=TH_LEV):
+def ipv(uwnd, vwnd, tair, pres, lat, lon, th_levels=TH_LEV, geom=None):
     """
     Calculate isentropic PV on theta surfaces.
 
     Notes
     -----
-    Interpolation assumes pressure is monotonically increasing.
+    Interpolation assumes pressure is monotonic, in either direction. Where potential
+    temperature crosses a theta level more than once, the topmost crossing is used.
 
     Parameters
     ----------
@@ -1401,6 +2055,8 @@ def ipv(uwnd, vwnd, tair, pres, lat, lon, th_levels=TH_LEV):
         1D longitude in degrees
     th_levels : array_like
         1D Theta levels on which to calculate PV
+    geom : :class:`GridGeometry`, optional
+        Metric factors for the grid, default is from :func:`grid_geometry`
 
 
     Returns
@@ -1414,19 +2070,18 @@ def ipv(uwnd, vwnd, tair, pres, lat, lon, th_levels=TH_LEV):
         Zonal wind on isentropic levels [m/s]
 
     """
+    pres, uwnd, vwnd, tair = _surface_first(np.asarray(pres), uwnd, vwnd, tair, axis=-3)
     # Calculate potential temperature on isobaric (pressure) levels
     thta = theta(tair, pres)
     # Interpolate zonal, meridional wind, pressure to isentropic from isobaric levels
-    u_th = vinterp(uwnd, thta, th_levels)
-    v_th = vinterp(vwnd, thta, th_levels)
-    p_th = vinterp(pres, thta, th_levels)
+    u_th, v_th, p_th = vinterp_multi([uwnd, vwnd, pres], thta, th_levels)
     # Calculate IPV on theta levels
-    ipv_out = ipv_theta(u_th, v_th, p_th, lat, lon, th_levels)
+    ipv_out = ipv_theta(u_th, v_th, p_th, lat, lon, th_levels, geom=geom)
 
     return ipv_out, p_th, u_th
 
 
-def ipv_theta(uwnd, vwnd, pres, lat, lon, th_levels):
+def ipv_theta(uwnd, vwnd, pres, lat, lon, th_levels, geom=None):
     """
     Calculate isentropic PV on theta surfaces from data on theta levels.
 
@@ -1444,6 +2099,8 @@ def ipv_theta(uwnd, vwnd, pres, lat, lon, th_levels):
         1D longitude in degrees
     th_levels : array_like
         1D Theta levels on which to calculate PV
+    geom : :class:`GridGeometry`, optional
+        Metric factors for the grid, default is from :func:`grid_geometry`
 
 
     Returns
@@ -1453,8 +2110,11 @@ def ipv_theta(uwnd, vwnd, pres, lat, lon, th_levels):
         of m-2 s-1 K kg-1 (e.g. 10^6 PVU)
 
     """
+    if geom is None:
+        geom = grid_geometry(lat, lon)
+
     # Calculate relative vorticity on isentropic levels
-    rel_v = rel_vort(uwnd, vwnd, lat, lon)
+    rel_v = rel_vort(uwnd, vwnd, lat, lon, geom=geom)
 
     # Calculate d{Theta} / d{pressure} on isentropic levels
     dthdp = 1.0 / diffz(pres, th_levels)
@@ -1464,7 +2124,7 @@ def ipv_theta(uwnd, vwnd, pres, lat, lon, th_levels):
     lat_bcast = [np.newaxis] * rel_v.ndim
     lat_axis = np.where(np.array(rel_v.shape) == lat.shape[0])[0][0]
     lat_bcast[lat_axis] = slice(None)
-    f_cor = 2.0 * OM * np.sin(lat[lat_bcast] * RAD)
+    f_cor = geom.f_cor[tuple(lat_bcast)]
 
     # Calculate IPV, then correct for y-derivative problems at poles
     ipv_out = -GRV * (rel_v + f_cor) * dthdp
@@ -1476,7 +2136,7 @@ def ipv_theta(uwnd, vwnd, pres, lat, lon, th_levels):
     return ipv_out
 
 
-def xripv_theta(uwnd, vwnd, pres, dimvars):
+def xripv_theta(uwnd, vwnd, pres, dimvars, geom=None):
     """
     Calculate isentropic PV on theta surfaces from data on theta levels.
 
@@ -1491,6 +2151,8 @@ def xripv_theta(uwnd, vwnd, pres, dimvars):
     dimvars : dict
         Mapping of variable names for standard coordinates. This will default
         to 'theta' -> 'theta', 'lat' -> 'lat', 'lon' -> 'lon'
+    geom : :class:`GridGeometry`, optional
+        Metric factors for the grid, default is from :func:`grid_geometry`
 
     Returns
     -------
@@ -1500,15 +2162,20 @@ def xripv_theta(uwnd, vwnd, pres, dimvars):
 
     """
     th_var = dimvars.get('lev', 'level')
+    vlat = dimvars.get('lat', 'lat')
+    if geom is None:
+        geom = grid_geometry(uwnd[vlat].values, uwnd[dimvars.get('lon', 'lon')].values)
+
     # Calculate relative vorticity on isentropic levels
-    rel_v = xr_rel_vort(uwnd, vwnd, dimvars, cyclic=True)
+    rel_v = xr_rel_vort(uwnd, vwnd, dimvars, cyclic=True, geom=geom)
 
     # Calculate d{Theta} / d{pressure} on isentropic levels
-    dthdp = 1.0 / xrdiffz(pres, pres[th_var], dim=th_var)
+    dthdp = 1.0 / xrdiffz(pres, pres[th_var].astype(pres.dtype), dim=th_var)
 
     # Calculate Coriolis force
     # First, get axis matching latitude to input data
-    f_cor = 2.0 * OM * (RAD * uwnd[dimvars['lat']]).pipe(np.sin)
+    f_cor = xr.DataArray(geom.f_cor.astype(uwnd.dtype), dims=(vlat, ),
+                         coords={vlat: uwnd[vlat]})
 
     # Calculate IPV, then correct for y-derivative problems at poles
     ipv_out = -GRV * (rel_v + f_cor) * dthdp
@@ -1517,13 +2184,118 @@ def xripv_theta(uwnd, vwnd, pres, dimvars):
     return ipv_out
 
 
-def xripv(uwnd, vwnd, tair, dimvars=None, th_levels=TH_LEV):
+def _pres_scale(pres):
+    """Get factor to convert pressure coordinate :class:`xarray.DataArray` to Pa."""
+    if pres.attrs.get('units', None) in ['hPa', 'mb', 'millibar', 'millibars']:
+        scale = 100.0
+    else:
+        scale = 1.0
+    return scale
+
+
+def _surface_first(pres, *fields, axis=-1):
+    """
+    Order the levels of `pres` and `fields` so pressure decreases along `axis`.
+
+    Where potential temperature crosses a theta level more than once in a column,
+    :func:`_bracket_search` uses the bracket with the highest index, so with levels
+    from the surface up, that is the topmost crossing whatever order the input is in.
+
+    Parameters
+    ----------
+    pres : array_like
+        1-D pressure levels, or N-D pressure with the same shape as each of `fields`
+    fields : array_like
+        N-D arrays on the levels of `pres`
+    axis : int
+        Vertical axis of `fields` (and of `pres`, if it is N-D)
+
+    Returns
+    -------
+    pres, *fields : array_like
+        Input, with the vertical axis reversed if pressure increases along it
+
+    """
+    p_ax = axis if pres.ndim > 1 else 0
+    # Every column has its levels in the same order, so the first one is checked
+    col = np.moveaxis(pres, p_ax, -1)
+    col = col.reshape(-1, col.shape[-1])[0]
+    if col.shape[0] == 0 or col[0] >= col[-1]:
+        return (pres, *fields)
+    return (np.flip(pres, axis=p_ax), *[np.flip(data, axis=axis) for data in fields])
+
+
+def _ipv_kernel(uwnd, vwnd, tair, pres, coslat, f_cor, dlat, dlon, th_levels=None,
+                cyclic=True):
+    """
+    Compute IPV, pressure and zonal wind on theta levels, blockwise kernel of xripv.
+
+    Parameters
+    ----------
+    uwnd, vwnd, tair : array_like
+        N-D zonal wind, meridional wind and air temperature on pressure (or model)
+        levels, where the last three axes are (lat, lon, level)
+    pres : array_like
+        1-D pressure levels, or N-D pressure the same shape as `tair` [Pa]
+    coslat, f_cor, dlat : array_like
+        Cosine of latitude, Coriolis parameter and latitude differences [radians], with
+        shape (lat, 1, 1)
+    dlon : array_like
+        Longitude differences [radians] with shape (lon, 1)
+    th_levels : array_like
+        1-D theta levels to compute IPV on
+    cyclic : bool
+        Flag to indicate if data is cyclic in longitude direction, if False, the first
+        and last longitude get forward / backward differences
+
+    Returns
+    -------
+    ipv_th : array_like
+        IPV, pressure and zonal wind on `th_levels`, concatenated along the last axis
+
+    """
+    dtype = uwnd.dtype
+    pres, uwnd, vwnd, tair = _surface_first(pres, uwnd, vwnd, tair)
+    thta = tair * ((100000.0 / pres) ** KPPA).astype(dtype)
+    u_th, v_th, p_th = _vinterp_kernel(thta, uwnd, vwnd, pres.astype(dtype),
+                                       vlevels=th_levels)
+    del thta
+
+    # Relative vorticity, d(vwnd) / d(lon) - d(uwnd) / d(lat), in place where possible
+    ipv_th = stencils.diff_cfd(v_th, axis=-2, cyclic=cyclic)
+    ipv_th /= (EARTH_R * coslat * dlon).astype(dtype)
+    dudlat = stencils.diff_cfd(u_th, axis=-3, cyclic=False)
+    dudlat /= (EARTH_R * dlat).astype(dtype)
+    ipv_th -= dudlat
+    del dudlat, v_th
+
+    # IPV = -g * (relative vorticity + f) * d{Theta} / d{pressure}
+    ipv_th += f_cor.astype(dtype)
+    ipv_th *= -GRV
+    ipv_th /= stencils.diffz(p_th, th_levels, axis=-1)
+
+    return np.concatenate((ipv_th, p_th, u_th), axis=-1)
+
+
+def xripv(uwnd, vwnd, tair, dimvars=None, th_levels=TH_LEV, geom=None, pres=None,
+          pfac=None):
     """
     Calculate isentropic PV on theta surfaces from :class:`xarray.DataArray`.
 
     Notes
     -----
-    Interpolation assumes pressure is monotonically increasing.
+    Potential temperature, interpolation to theta levels, relative vorticity and
+    d{Theta} / d{pressure} are all computed by one function for each chunk of input,
+    so none are stored for the full dataset. Chunks may be split in latitude and
+    longitude, they are extended by one point from their neighbours for the
+    horizontal derivatives.
+
+    For data on model (e.g. hybrid sigma-pressure) levels, `pres` is the pressure of
+    each point, it is used in the same way, so the data need not be interpolated to
+    pressure levels first.
+
+    Levels may be in either order. Where potential temperature crosses a theta level
+    more than once, the topmost crossing is used.
 
     Parameters
     ----------
@@ -1538,7 +2310,16 @@ def xripv(uwnd, vwnd, tair, dimvars=None, th_levels=TH_LEV):
         to 'lev' -> 'level', 'lat' -> 'lat', 'lon' -> 'lon'
     th_levels : array_like
         1D array of Theta levels on which to calculate PV
-
+    geom : :class:`GridGeometry`, optional
+        Metric factors for the grid, default is from :func:`grid_geometry`
+    pres : :class:`xarray.DataArray`, optional
+        3 or 4-D pressure [Pa] with the same dimensions as `tair`, default is the
+        vertical coordinate of `uwnd`, which is then pressure levels
+    pfac : float, optional
+        Multiply the vertical coordinate of `uwnd` by this to get pressure in Pa
+        (`pfac` in the data configuration), where `pres` is not given. Default is None,
+        which guesses from the coordinate's `units` attribute, and uses Pa if there
+        isn't one
 
     Returns
     -------
@@ -1551,38 +2332,144 @@ def xripv(uwnd, vwnd, tair, dimvars=None, th_levels=TH_LEV):
         Zonal wind on isentropic levels [m/s]
 
     """
-    # import pdb;pdb.set_trace()
-    th_levels = np.float32(th_levels)
+    # Theta levels are in the same precision as the input data
+    th_levels = np.asarray(th_levels, dtype=tair.dtype)
+    n_th = th_levels.shape[0]
     if dimvars is None:
         dimvars = {'lev': 'level', 'lat': 'lat', 'lon': 'lon'}
+    vlev, vlat, vlon = dimvars['lev'], dimvars['lat'], dimvars['lon']
+
+    if geom is None:
+        geom = grid_geometry(uwnd[vlat].values, uwnd[vlon].values)
+
+    # The kernel works on data with trailing axes (lat, lon, lev)
+    in_dims = uwnd.dims
+    if pres is None:
+        fields = xr.unify_chunks(uwnd, vwnd, tair)
+        if pfac is None:
+            pfac = _pres_scale(uwnd[vlev])
+        pres = uwnd[vlev].values * pfac
+    else:
+        fields = xr.unify_chunks(uwnd, vwnd, tair, pres.astype(tair.dtype))
+    fields = [data.transpose(..., vlat, vlon, vlev) for data in fields]
+    uwnd = fields[0]
+    geom_args = [geom.coslat[:, None, None], geom.f_cor[:, None, None],
+                 geom.dlat[:, None, None], geom.dlon[:, None]]
+    kwargs = {'th_levels': th_levels}
+
+    if uwnd.chunks is None:
+        if len(fields) == 4:
+            pres = fields.pop().values
+        ipv_th = _ipv_kernel(*[data.values for data in fields], pres, *geom_args,
+                             cyclic=True, **kwargs)
+    else:
+        # Chunks split in latitude or longitude get a halo of one point, for the
+        # derivatives. Longitude is only differenced cyclically in the kernel when whole
+        lat_ax, lon_ax = uwnd.ndim - 3, uwnd.ndim - 2
+        depth = {axis: 1 for axis in (lat_ax, lon_ax) if len(uwnd.chunks[axis]) > 1}
+        boundary = {axis: {lat_ax: 'none', lon_ax: 'periodic'}[axis] for axis in depth}
+        fields = [da.overlap.overlap(data.chunk({vlev: -1}).data, depth, boundary)
+                  for data in fields]
+        if len(fields) == 4:
+            pres = fields.pop()
+
+        # Metric factors need to match the extended chunks of the data
+        geom_axes = [lat_ax, lat_ax, lat_ax, lon_ax]
+        geom_args = [da.from_array(fac, chunks=(uwnd.chunks[axis], ) + fac.shape[1:])
+                     for fac, axis in zip(geom_args, geom_axes)]
+        geom_args = [da.overlap.overlap(fac, {0: 1}, {0: boundary[axis]})
+                     if axis in depth else fac for fac, axis in zip(geom_args, geom_axes)]
+
+        ipv_th = da.map_blocks(_ipv_kernel, *fields, pres, *geom_args,
+                               cyclic=lon_ax not in depth, dtype=uwnd.dtype,
+                               chunks=fields[0].chunks[:-1] + ((3 * n_th, ), ), **kwargs)
+        if depth:
+            ipv_th = da.overlap.trim_internal(ipv_th, depth, boundary=boundary)
+
+    coords = {dim: uwnd[dim] for dim in uwnd.dims if dim != vlev}
+    coords[vlev] = th_levels
+    ipv_out, p_th, u_th = [
+        xr.DataArray(ipv_th[..., idx * n_th:(idx + 1) * n_th], dims=uwnd.dims,
+                     coords=coords).transpose(*in_dims) for idx in range(3)
+    ]
 
-    vlev = dimvars['lev']
+    return ipv_out, p_th, u_th
 
-    # Calculate potential temperature on isobaric (pressure) levels
-    thta = xrtheta(tair, pvar=vlev)
 
-    # Interpolate zonal, meridional wind, pressure to isentropic from
-    # isobaric levels
+def _epv_kernel(epv, uwnd, tair, pres=None, th_levels=None):
+    """Interpolate isobaric PV and zonal wind to theta levels, kernel of xrepv_theta."""
+    pres, epv, uwnd, tair = _surface_first(pres, epv, uwnd, tair)
+    thta = tair * ((100000.0 / pres) ** KPPA).astype(tair.dtype)
+    return _vinterp_kernel(thta, epv, uwnd, vlevels=th_levels)
 
-    u_th = xrvinterp(uwnd, thta, th_levels, levname=vlev,
-                     newlevname=vlev)
-    v_th = xrvinterp(vwnd, thta, th_levels, levname=vlev,
-                     newlevname=vlev)
 
-    # Check the units of uwnd.level to be sure to use Pa
-    try:
-        _punits = uwnd.level['units']
-    except (KeyError, AttributeError):
-        _punits = None
-    if _punits in ['hPa', 'mb', 'millibar']:
-        scale = 100.
-    else:
-        scale = 1.
+def xrepv_theta(epv, uwnd, tair, dimvars=None, th_levels=TH_LEV, pres=None, pfac=None):
+    """
+    Interpolate PV on pressure levels to theta surfaces from :class:`xarray.DataArray`.
 
-    p_th = xrvinterp(scale * uwnd[vlev], thta, th_levels, levname=vlev,
-                     newlevname=vlev)
+    Parameters
+    ----------
+    epv : :class:`xarray.DataArray`
+        3 or 4-D potential vorticity (t, p, y, x) or (p, y, x)
+    uwnd : :class:`xarray.DataArray`
+        3 or 4-D zonal wind component (t, p, y, x) or (p, y, x)
+    tair : :class:`xarray.DataArray`
+        3 or 4-D air temperature (t, p, y, x) or (p, y, x)
+    dimvars : dict
+        Mapping of variable names for standard coordinates. This will default
+        to 'lev' -> 'level', 'lat' -> 'lat', 'lon' -> 'lon'
+    th_levels : array_like
+        1D array of Theta levels on which to interpolate PV
+    pres : :class:`xarray.DataArray`, optional
+        3 or 4-D pressure [Pa] with the same dimensions as `tair`, for data on model
+        levels, default is the vertical coordinate of `uwnd`
+    pfac : float, optional
+        Multiply the vertical coordinate of `uwnd` by this to get pressure in Pa
+        (`pfac` in the data configuration), where `pres` is not given. Default is None,
+        which guesses from the coordinate's `units` attribute, and uses Pa if there
+        isn't one
 
-    # Calculate IPV on theta levels
-    ipv_out = xripv_theta(u_th, v_th, p_th, dimvars)
+    Returns
+    -------
+    ipv : :class:`xarray.DataArray`
+        3 or 4-D isentropic potential vorticity, in units of `epv`
+    u_th : :class:`xarray.DataArray`
+        Zonal wind on isentropic levels [m/s]
 
-    return ipv_out, p_th, u_th
+    Notes
+    -----
+    Potential temperature and the interpolation are computed by one function for each
+    chunk of input, see :func:`xrvinterp_multi`.
+
+    """
+    th_levels = np.asarray(th_levels, dtype=tair.dtype)
+    if dimvars is None:
+        dimvars = {'lev': 'level', 'lat': 'lat', 'lon': 'lon'}
+    vlev = dimvars['lev']
+    args = [epv, uwnd, tair]
+    kwargs = {'th_levels': th_levels}
+    if pres is None:
+        if pfac is None:
+            pfac = _pres_scale(uwnd[vlev])
+        kwargs['pres'] = uwnd[vlev].values * pfac
+    else:
+        args.append(pres.astype(tair.dtype))
+
+    _outdim = '{}_interp'.format(vlev)
+    ipv, u_th = xr.apply_ufunc(
+        _epv_kernel,
+        *args,
+        input_core_dims=[[vlev]] * len(args),
+        output_core_dims=[[_outdim]] * 2,
+        exclude_dims={vlev},
+        dask='parallelized',
+        output_dtypes=[np.result_type(epv.dtype, tair.dtype),
+                       np.result_type(uwnd.dtype, tair.dtype)],
+        dask_gufunc_kwargs={'output_sizes': {_outdim: th_levels.shape[0]},
+                            'allow_rechunk': True},
+        kwargs=kwargs,
+    )
+    ipv, u_th = [data.rename({_outdim: vlev}).assign_coords(**{vlev: th_levels})
+                 .transpose(*epv.dims) for data in (ipv, u_th)]
+
+    return ipv, u_th
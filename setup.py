@@ -27,6 +27,6 @@ setup(
         "PyYAML>=3.12",
         "scipy>=0.19.0",
         "seaborn>=0.9.0",
-        "xarray>=0.9.0",
+        "xarray>=0.16.1",
     ],
 )